@@ -0,0 +1,134 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from persistence import PersistenceWorker
+
+# Take a backup at least this often while the data keeps changing
+BACKUP_INTERVAL = timedelta(hours=1)
+
+# ...and sooner once this many changes have piled up
+BACKUP_AFTER_CHANGES = 50
+
+# How often the scheduler checks the two conditions above
+CHECK_INTERVAL = timedelta(seconds=30)
+
+# Most bytes of backup chunks written per second, so a backup never saturates the disk
+BACKUP_IO_RATE = 2 * 1024 * 1024
+
+# Scheduler key of the backup check, next to the reminders keyed by task ID
+BACKUP_KEY = "__backup__"
+
+# Longest stop() waits for a backup in progress to notice it was cancelled
+STOP_TIMEOUT = 5
+
+class BackupCancelled(Exception):
+    pass
+
+class BackupScheduler:
+    """Automatic background backups into a BackupStore.
+    
+    The timing rides on the notification service's ReminderScheduler: a
+    check is one more entry in its heap and reschedules itself, so no
+    thread is added for it. The check only compares counters; the backup
+    itself runs on a worker thread of its own, paced to BACKUP_IO_RATE,
+    so neither reminders nor the Tk main loop wait for the disk. A check
+    that finds no changes since the last backup does nothing.
+    """
+    def __init__(self, db_manager, store, scheduler, interval=BACKUP_INTERVAL,
+                 after_changes=BACKUP_AFTER_CHANGES, io_rate=BACKUP_IO_RATE, on_error=None):
+        self.db_manager = db_manager
+        self.store = store
+        self.scheduler = scheduler
+        self.interval = interval
+        self.after_changes = after_changes
+        self.io_rate = io_rate
+        self.on_error = on_error  # Called as on_error(title, message) from the worker thread
+        self.last_backup = None  # Manifest of the last automatic backup
+        self._backed_up_changes = db_manager.changes  # Change count the last backup covered
+        self._backed_up_at = time.monotonic()
+        self._stopping = threading.Event()
+        self.worker = PersistenceWorker(on_error=self._report_error)
+        
+    def start(self):
+        self.scheduler.schedule(BACKUP_KEY, datetime.now() + CHECK_INTERVAL, self._check)
+        
+    def stop(self, timeout=STOP_TIMEOUT):
+        """Cancel the timer and abandon a backup in progress; what it wrote is swept by the next prune.
+        
+        Called on the Tk thread when the window closes, so it gives up
+        waiting after timeout seconds rather than blocking the exit.
+        """
+        self.scheduler.cancel(BACKUP_KEY)
+        self._stopping.set()
+        self.worker.stop(timeout)
+        
+    def _check(self):
+        # Runs on the reminder scheduler thread; keep it cheap
+        if self._stopping.is_set():
+            return
+        changes = self.db_manager.changes - self._backed_up_changes
+        elapsed = time.monotonic() - self._backed_up_at
+        if changes >= self.after_changes or (changes and elapsed >= self.interval.total_seconds()):
+            self.request()
+        self.scheduler.schedule(BACKUP_KEY, datetime.now() + CHECK_INTERVAL, self._check)
+        
+    def request(self):
+        """Queue a backup; a request made while one is queued is folded into it"""
+        self.worker.submit("backup", self._backup)
+        
+    def backup_now(self, on_done):
+        """Queue an unthrottled backup even if no change was counted, e.g. for the Backup button.
+        
+        on_done(manifest, removed backup IDs, error) is called from the worker thread,
+        unless stop() was called first.
+        """
+        def job():
+            if self._stopping.is_set():
+                return
+            changes = self.db_manager.changes
+            try:
+                manifest = self.db_manager.backup(self.store, pace=self._cancel_if_stopping)
+                removed = self.store.prune()
+            except BackupCancelled:
+                return
+            except Exception as e:
+                if not self._stopping.is_set():
+                    on_done(None, [], e)
+                return
+            self._backed_up_changes = changes
+            self._backed_up_at = time.monotonic()
+            if not self._stopping.is_set():
+                on_done(manifest, removed, None)
+        self.worker.submit("manual", job)
+        
+    def _backup(self):
+        changes = self.db_manager.changes
+        if changes == self._backed_up_changes or self._stopping.is_set():
+            return
+        try:
+            manifest = self.db_manager.backup(self.store, pace=self._pace)
+            self.store.prune()
+        except BackupCancelled:
+            return
+        self._backed_up_changes = changes
+        self._backed_up_at = time.monotonic()
+        if manifest is not None:
+            self.last_backup = manifest
+            
+    def _pace(self, written):
+        # Called after every chunk; sleep long enough to keep the write rate at io_rate
+        if self._stopping.wait(written / self.io_rate if self.io_rate else 0):
+            raise BackupCancelled()
+            
+    def _cancel_if_stopping(self, written):
+        # The unthrottled pace of a manual backup: no sleep, but stop() still cancels it
+        if self._stopping.is_set():
+            raise BackupCancelled()
+            
+    def _report_error(self, name, e):
+        message = f"Error taking an automatic backup: {str(e)}"
+        # Once stopping, the window is closing and would not show a dialog any more
+        if self.on_error and not self._stopping.is_set():
+            self.on_error("Backup Error", message)
+        else:
+            print(message)
@@ -0,0 +1,297 @@
+import hashlib
+import json
+import os
+import threading
+import zlib
+from datetime import datetime, timedelta
+from history_store import CHUNK_SIZE, HistoryStore
+
+# Average number of tasks per chunk; a chunk ends after a task whose ID hash is a multiple of it
+TASK_CHUNK_ROWS = 256
+
+# Upper bound on tasks per chunk, for runs of IDs that never hit a boundary
+MAX_TASK_CHUNK_ROWS = 4 * TASK_CHUNK_ROWS
+
+# Backups kept by prune(): the most recent ones, plus the newest of each recent day and week
+RETENTION = {"last": 10, "daily": 7, "weekly": 4}
+
+# Manifest names, which sort in the order the backups were taken
+ID_FORMAT = "%Y%m%d_%H%M%S_%f"
+
+def encode_rows(rows):
+    return "".join(json.dumps(row, sort_keys=True, default=str) + "\n" for row in rows).encode("utf-8")
+
+def decode_rows(data):
+    return [json.loads(line) for line in data.decode("utf-8").splitlines() if line]
+
+def task_chunks(tasks):
+    """Split the task list into chunks whose boundaries depend on the task IDs.
+    
+    Adding, changing or removing a task only changes the chunk it is in; the
+    chunks around it keep their content and so their hash.
+    """
+    chunk = []
+    for task in tasks:
+        chunk.append(task)
+        boundary = zlib.crc32(str(task.get("ID")).encode("utf-8")) % TASK_CHUNK_ROWS == 0
+        if boundary or len(chunk) >= MAX_TASK_CHUNK_ROWS:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+class BackupStore:
+    """Content-addressed, incremental backups of the tasks and history.
+    
+    Every backup is a small JSON manifest listing the hashes of the chunks
+    it is made of. Chunks are zlib-compressed and stored once under their
+    SHA-256, so a backup only writes the chunks that changed since any
+    earlier one: the task chunks around edited tasks, and the last page of
+    the append-only history. Pruning drops manifests by the retention
+    policy and then deletes the chunks no remaining manifest refers to.
+    
+    The store also keeps a log of every change with its time (record()).
+    A backup notes how far the log had got, so state_at() can rebuild any
+    moment from the latest backup before it plus the changes logged after.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.objects_dir = os.path.join(directory, "objects")
+        self.manifests_dir = os.path.join(directory, "manifests")
+        self.log = HistoryStore(os.path.join(directory, "log"))
+        # Held only to commit a manifest or prune; chunks are written without it, since reading
+        # the history pages calls back into the DatabaseManager and pace() sleeps
+        self._lock = threading.Lock()
+        self._writing = 0  # Backups writing chunks not yet referenced by a manifest
+        
+    def record(self, op, **fields):
+        """Log a change: the journal's ops ("add", "update", "delete", "clear"), "history_clear",
+        or "reset" when the data was replaced wholesale by the backup named in the record"""
+        self.log.append(dict(fields, op=op, time=datetime.now().isoformat()))
+        
+    def record_many(self, op, records):
+        """Log one change per dict of fields, written in one go"""
+        now = datetime.now().isoformat()
+        self.log.extend([dict(fields, op=op, time=now) for fields in records])
+        
+    def log_position(self):
+        return len(self.log)
+        
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest[2:])
+        
+    def _put(self, data):
+        # Returns (hash, bytes written); chunks that are already stored cost nothing
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        if os.path.exists(path):
+            return digest, 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        compressed = zlib.compress(data, 6)
+        # Two backups may write the same chunk at once; each uses a temporary file of its own
+        temp = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp, "wb") as f:
+            f.write(compressed)
+        os.replace(temp, path)
+        return digest, len(compressed)
+        
+    def _get(self, digest):
+        with open(self._object_path(digest), "rb") as f:
+            return zlib.decompress(f.read())
+            
+    def backup(self, tasks, history_pages, history_count=None, pace=None, as_of=None, log_position=None):
+        """Store a backup and return its manifest.
+        
+        history_pages yields the history in pages of CHUNK_SIZE rows, so the
+        unchanged pages hash the same every time. If nothing changed since
+        the latest backup, no new backup is made and None is returned.
+        pace(bytes written) is called after every chunk, e.g. to throttle I/O.
+        as_of and log_position say when the data was copied and how many
+        logged changes it already includes; without them the backup can be
+        restored as it is, but not replayed forward.
+        """
+        with self._lock:
+            self._writing += 1
+        try:
+            written = 0
+            task_hashes = []
+            for chunk in task_chunks(tasks):
+                digest, size = self._put(encode_rows(chunk))
+                task_hashes.append(digest)
+                written += size
+                if pace:
+                    pace(size)
+            history_hashes = []
+            for page in history_pages:
+                digest, size = self._put(encode_rows(page))
+                history_hashes.append(digest)
+                written += size
+                if pace:
+                    pace(size)
+            return self._commit(task_hashes, history_hashes, len(tasks), history_count, written,
+                                as_of, log_position)
+        finally:
+            with self._lock:
+                self._writing -= 1
+                
+    def _commit(self, task_hashes, history_hashes, task_count, history_count, written, as_of, log_position):
+        with self._lock:
+            latest = self.latest()
+            if latest and latest["tasks"] == task_hashes and latest["history"] == history_hashes:
+                return None
+                
+            created = datetime.now()
+            manifest = {
+                "id": created.strftime(ID_FORMAT),
+                "created": created.isoformat(timespec="seconds"),
+                "tasks": task_hashes,
+                "history": history_hashes,
+                "task_count": task_count,
+                "history_count": history_count,
+                "bytes_written": written,
+                "as_of": (as_of or created).isoformat(),
+                "log_position": log_position,
+            }
+            # The manifest goes last, so a backup interrupted halfway leaves only unreferenced chunks
+            os.makedirs(self.manifests_dir, exist_ok=True)
+            path = os.path.join(self.manifests_dir, manifest["id"] + ".json")
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+            os.replace(path + ".tmp", path)
+            return manifest
+            
+    def list(self):
+        """Manifests of every backup, newest first"""
+        if not os.path.isdir(self.manifests_dir):
+            return []
+        manifests = []
+        for name in sorted(os.listdir(self.manifests_dir), reverse=True):
+            if name.endswith(".json"):
+                with open(os.path.join(self.manifests_dir, name), encoding="utf-8") as f:
+                    manifests.append(json.load(f))
+        return manifests
+        
+    def latest(self):
+        manifests = self.list()
+        return manifests[0] if manifests else None
+        
+    def get(self, backup_id):
+        with open(os.path.join(self.manifests_dir, backup_id + ".json"), encoding="utf-8") as f:
+            return json.load(f)
+            
+    def restore(self, backup_id):
+        """(tasks, history rows) as they were when the backup was taken"""
+        manifest = self.get(backup_id)
+        tasks = []
+        for digest in manifest["tasks"]:
+            tasks.extend(decode_rows(self._get(digest)))
+        history = []
+        for digest in manifest["history"]:
+            history.extend(decode_rows(self._get(digest)))
+        return tasks, history
+        
+    def state_at(self, when):
+        """(tasks, history rows) as they were at the datetime when"""
+        # Start from the latest backup copied by then that the log can carry forward
+        base = next((manifest for manifest in self.list() if manifest.get("log_position") is not None
+                     and datetime.fromisoformat(manifest["as_of"]) <= when), None)
+        if base is None:
+            raise ValueError(f"No backup was taken before {when:%Y-%m-%d %H:%M:%S}")
+        tasks, history = self.restore(base["id"])
+        by_id = {task["ID"]: task for task in tasks}
+        
+        cursor = self.log.cursor(base["log_position"])
+        while True:
+            records = cursor.fetch()
+            if not records:
+                break
+            for record in records:
+                if datetime.fromisoformat(record["time"]) > when:
+                    return list(by_id.values()), history
+                op = record["op"]
+                if op == "add":
+                    by_id[record["task"]["ID"]] = record["task"]
+                    history.append(record["task"])
+                elif op == "update" and record["id"] in by_id:
+                    by_id[record["id"]] = record["task"]
+                elif op == "delete":
+                    by_id.pop(record["id"], None)
+                elif op == "clear":
+                    by_id.clear()
+                elif op == "history_clear":
+                    history = []
+                elif op == "reset":
+                    tasks, history = self.restore(record["backup"])
+                    by_id = {task["ID"]: task for task in tasks}
+        return list(by_id.values()), history
+        
+    def prune(self, now=None, last=RETENTION["last"], daily=RETENTION["daily"], weekly=RETENTION["weekly"]):
+        """Delete the backups outside the retention policy and the chunks only they used"""
+        with self._lock:
+            now = now or datetime.now()
+            manifests = self.list()
+            keep = {manifest["id"] for manifest in manifests[:last]}
+            days = set()
+            weeks = set()
+            for manifest in manifests:
+                created = datetime.fromisoformat(manifest["created"])
+                day = created.date()
+                week = created.isocalendar()[:2]
+                if now - created <= timedelta(days=daily) and day not in days:
+                    days.add(day)
+                    keep.add(manifest["id"])
+                if now - created <= timedelta(weeks=weekly) and week not in weeks:
+                    weeks.add(week)
+                    keep.add(manifest["id"])
+                    
+            # Changes logged before the oldest backup that can be replayed are never needed again;
+            # the backups that later resets in the log start over from have to stay
+            positions = [manifest["log_position"] for manifest in manifests
+                         if manifest["id"] in keep and manifest.get("log_position") is not None]
+            if positions:
+                self.log.drop_before(min(positions))
+                cursor = self.log.cursor(min(positions))
+                records = cursor.fetch()
+                while records:
+                    keep.update(record["backup"] for record in records if record["op"] == "reset")
+                    records = cursor.fetch()
+                        
+            removed = [manifest["id"] for manifest in manifests if manifest["id"] not in keep]
+            for backup_id in removed:
+                os.remove(os.path.join(self.manifests_dir, backup_id + ".json"))
+                
+            # Sweep the chunks that no kept backup refers to; while a backup is still writing,
+            # its chunks are not referenced yet, so the sweep waits for a later prune
+            if self._writing:
+                return removed
+            used = set()
+            for manifest in manifests:
+                if manifest["id"] in keep:
+                    used.update(manifest["tasks"])
+                    used.update(manifest["history"])
+            if os.path.isdir(self.objects_dir):
+                for prefix in os.listdir(self.objects_dir):
+                    folder = os.path.join(self.objects_dir, prefix)
+                    for name in os.listdir(folder):
+                        if prefix + name not in used:
+                            os.remove(os.path.join(folder, name))
+            return removed
+
+def diff_tasks(old, new):
+    """(added, removed, changed) going from one task list to another, matched by ID.
+    
+    changed holds (old task, new task) pairs.
+    """
+    old_by_id = {task["ID"]: task for task in old}
+    new_by_id = {task["ID"]: task for task in new}
+    added = [task for task_id, task in new_by_id.items() if task_id not in old_by_id]
+    removed = [task for task_id, task in old_by_id.items() if task_id not in new_by_id]
+    changed = [(old_by_id[task_id], task) for task_id, task in new_by_id.items()
+               if task_id in old_by_id and encode_rows([old_by_id[task_id]]) != encode_rows([task])]
+    return added, removed, changed
+
+def history_pages(count, read):
+    """The first count history rows in pages of up to CHUNK_SIZE, from read(start, count)"""
+    for start in range(0, count, CHUNK_SIZE):
+        # Rows appended since count was taken belong to the change log, not the backup
+        yield read(start, min(CHUNK_SIZE, count - start))
@@ -0,0 +1,437 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from database import DatabaseManager
+from notifications import NotificationManager, ReminderScheduler
+from storage import SnapshotBackend
+
+# Task counts benchmarked by default
+SIZES = (1000, 10000, 100000, 1000000)
+
+# Timed runs of each benchmark; the median is what gets compared
+REPEAT = 5
+
+# Slowdown of a median against the baseline that counts as a regression
+REGRESSION_THRESHOLD = 0.10
+
+# Edits timed together by the single-edit benchmark, reported per edit
+EDITS_PER_RUN = 100
+
+# Synthetic task fields, drawn with roughly the skew of a real list
+PRIORITIES = (("High", 2), ("Medium", 5), ("Low", 3))
+CATEGORIES = (("Work", 4), ("Personal", 3), ("Shopping", 1), ("Health", 1), ("Other", 1))
+STATUSES = (("Pending", 6), ("Completed", 4))
+WORDS = ("report", "meeting", "review", "call", "email", "budget", "plan", "draft", "invoice", "doctor",
+         "groceries", "gym", "project", "deadline", "client", "team", "update", "design", "fix", "release",
+         "notes", "slides", "taxes", "renew", "book", "order", "pay", "visit", "prepare", "follow")
+
+def _weighted(rng, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights)[0]
+
+def make_tasks(count, seed=0):
+    """count synthetic tasks; the same seed always gives the same tasks"""
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    tasks = []
+    for _ in range(count):
+        due = start + timedelta(days=rng.randrange(730))
+        reminder = ""
+        if rng.random() < 0.4:
+            reminder = (due + timedelta(minutes=rng.randrange(6 * 60, 20 * 60, 5))).strftime("%Y-%m-%d %H:%M")
+        tasks.append({
+            "Title": " ".join(rng.choices(WORDS, k=rng.randint(2, 6))).capitalize(),
+            "Description": " ".join(rng.choices(WORDS, k=rng.randint(0, 20))),
+            "Due Date": due.strftime("%Y-%m-%d"),
+            "Priority": _weighted(rng, PRIORITIES),
+            "Category": _weighted(rng, CATEGORIES),
+            "Status": _weighted(rng, STATUSES),
+            "Reminder Time": reminder,
+            "ID": f"{rng.getrandbits(128):032x}",
+        })
+    return tasks
+
+def measure(run, setup=None, repeat=REPEAT):
+    """Seconds taken by each of repeat calls of run(state); setup() makes state outside the timing"""
+    times = []
+    for _ in range(repeat):
+        state = setup() if setup else None
+        gc.collect()
+        started = time.perf_counter()
+        run(state)
+        times.append(time.perf_counter() - started)
+    return times
+
+class Context:
+    """One task count's data directory, filled once and shared by its benchmarks"""
+    def __init__(self, size, directory, repeat):
+        self.size = size
+        self.directory = directory
+        self.repeat = repeat
+        self.tasks = make_tasks(size)
+        self._db = None
+        # Write the snapshot and history straight through the backend, as a long-used list would have them
+        backend = SnapshotBackend(os.path.join(directory, "tasks.xlsx"), os.path.join(directory, "history.xlsx"))
+        backend.save_tasks(self.tasks)
+        backend.save_history(self.tasks)
+        backend.close()
+        
+    @property
+    def db(self):
+        if self._db is None:
+            self._db = self.open()
+        return self._db
+        
+    def open(self):
+        def on_error(title, message):
+            raise RuntimeError(message)
+        return DatabaseManager(data_dir=self.directory, on_error=on_error)
+        
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+def bench_open(ctx):
+    # Cold start: constructing the manager maps the snapshot and replays the journal
+    opened = []
+    times = measure(lambda state: opened.append(ctx.open()), repeat=ctx.repeat)
+    for db in opened:
+        db.close()
+    return times, 1
+
+def bench_import_main(ctx):
+    # Module import cost of the app in a fresh interpreter, the part of startup before the first frame
+    code = "import time; started = time.perf_counter(); import main; print(time.perf_counter() - started)"
+    directory = os.path.dirname(os.path.abspath(__file__))
+    times = []
+    for _ in range(ctx.repeat):
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                                cwd=directory)
+        times.append(float(result.stdout.strip().splitlines()[-1]))
+    return times, 1
+
+def bench_load(ctx):
+    return measure(lambda state: ctx.db.load_tasks(), repeat=ctx.repeat), 1
+
+def bench_save(ctx):
+    def run(state):
+        ctx.db.save_tasks()
+        ctx.db.flush()
+    return measure(run, repeat=ctx.repeat), 1
+
+def bench_edit(ctx):
+    # One journal record per edit, plus the compactions the edits trigger along the way
+    db = ctx.db
+    ids = [task["ID"] for task in ctx.tasks[:EDITS_PER_RUN]]
+    def run(state):
+        for task_id in ids:
+            task = dict(db.get_task(task_id))
+            task["Status"] = "Completed" if task["Status"] == "Pending" else "Pending"
+            db.update_task(task_id, task)
+        db.flush()
+    return measure(run, repeat=ctx.repeat), len(ids)
+
+def bench_filter_priority(ctx):
+    return measure(lambda state: ctx.db.filter_tasks(priority="High", category="Work"), repeat=ctx.repeat), 1
+
+def bench_filter_search(ctx):
+    db = ctx.db
+    # The first search builds the search index; time the searches that reuse it
+    db.filter_tasks(search_text="budget")
+    return measure(lambda state: db.filter_tasks(search_text="budget"), repeat=ctx.repeat), 1
+
+def bench_filter_search_edited(ctx):
+    db = ctx.db
+    task_id = ctx.tasks[0]["ID"]
+    db.filter_tasks(search_text="budget")
+    def setup():
+        # An edit re-indexes the one task it changed, not the whole list
+        db.update_task(task_id, dict(db.get_task(task_id)))
+    return measure(lambda state: db.filter_tasks(search_text="budget"), setup=setup, repeat=ctx.repeat), 1
+
+def bench_filter_sort(ctx):
+    db = ctx.db
+    task_id = ctx.tasks[0]["ID"]
+    def setup():
+        # Any edit invalidates the cached sort order, as it does in the app
+        db.update_task(task_id, dict(db.get_task(task_id)))
+    return measure(lambda state: db.filter_tasks(sort=[("Due Date", True), ("Priority", False)]),
+                   setup=setup, repeat=ctx.repeat), 1
+
+def bench_reminders_rehydrate(ctx):
+    # Read the reminder column and bulk-insert the future reminders, as at startup
+    state_file = os.path.join(ctx.directory, "reminders.state")
+    def setup():
+        # Nothing counts as missed, so no notification window is opened
+        with open(state_file, "w", encoding="utf-8") as f:
+            f.write(datetime.now().isoformat(timespec="seconds"))
+        return NotificationManager(state_file=state_file)
+    return measure(lambda manager: manager.rehydrate_reminders(ctx.db), setup=setup, repeat=ctx.repeat), ctx.size
+
+def bench_reminders_fire(ctx):
+    # Scheduler throughput: every reminder is already due, so the thread fires them back to back
+    def setup():
+        scheduler = ReminderScheduler()
+        done = threading.Event()
+        fired = [0]
+        def callback():
+            fired[0] += 1
+            if fired[0] == ctx.size:
+                done.set()
+        due = datetime.now() - timedelta(seconds=1)
+        scheduler.schedule_many((index, due, callback, None) for index in range(ctx.size))
+        return scheduler, done
+    def run(state):
+        scheduler, done = state
+        scheduler.start()
+        done.wait()
+        scheduler.stop()
+    return measure(run, setup=setup, repeat=ctx.repeat), ctx.size
+
+def _tree(ctx, root):
+    # Imported here so the data benchmarks run without a display
+    import tkinter as tk
+    from tkinter import ttk
+    from task_view import VirtualTreeview, TASK_COLUMNS, task_values
+    frame = ttk.Frame(root)
+    frame.pack(fill=tk.BOTH, expand=True)
+    view = VirtualTreeview(frame, TASK_COLUMNS, task_values, key_for=lambda task: task["ID"])
+    view.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+    root.update()
+    return frame, view
+
+def bench_tree_populate(ctx, root):
+    rows = ctx.db.tasks
+    def setup():
+        for child in root.winfo_children():
+            child.destroy()
+        return _tree(ctx, root)[1]
+    def run(view):
+        view.set_rows(rows)
+        root.update_idletasks()
+    return measure(run, setup=setup, repeat=ctx.repeat), 1
+
+def bench_tree_scroll(ctx, root):
+    # Jump to random positions, each one reconciling the materialized window
+    rng = random.Random(1)
+    view = _tree(ctx, root)[1]
+    view.set_rows(ctx.db.tasks)
+    root.update_idletasks()
+    def run(state):
+        for _ in range(20):
+            view.yview("moveto", rng.random())
+            root.update_idletasks()
+    return measure(run, repeat=ctx.repeat), 20
+
+def bench_refresh_task_list(ctx, root):
+    from main import TodoApp
+    view = _tree(ctx, root)[1]
+    # The real method on a stand-in for the app, so no reminders, backups or dialogs start
+    app = SimpleNamespace(sort_keys=[("Due Date", True)], task_view=view, db_manager=ctx.db)
+    def setup():
+        ctx.db.update_task(ctx.tasks[0]["ID"], dict(ctx.db.get_task(ctx.tasks[0]["ID"])))
+    def run(state):
+        TodoApp.refresh_task_list(app)
+        root.update_idletasks()
+    return measure(run, setup=setup, repeat=ctx.repeat), 1
+
+def bench_history_load(ctx, root):
+    from tkinter import ttk
+    from history import HistoryPage
+    frame = ttk.Frame(root)
+    frame.pack()
+    page = HistoryPage(frame, ctx.db)
+    def run(state):
+        page.load_history()
+        root.update_idletasks()
+    return measure(run, repeat=ctx.repeat), 1
+
+# name -> (group, function); the ui group needs a display
+BENCHMARKS = {
+    "import_main": ("data", bench_import_main),
+    "open": ("data", bench_open),
+    "load": ("data", bench_load),
+    "save": ("data", bench_save),
+    "edit": ("data", bench_edit),
+    "filter_priority": ("data", bench_filter_priority),
+    "filter_search": ("data", bench_filter_search),
+    "filter_search_edited": ("data", bench_filter_search_edited),
+    "filter_sort": ("data", bench_filter_sort),
+    "reminders_rehydrate": ("data", bench_reminders_rehydrate),
+    "reminders_fire": ("data", bench_reminders_fire),
+    "tree_populate": ("ui", bench_tree_populate),
+    "tree_scroll": ("ui", bench_tree_scroll),
+    "refresh_task_list": ("ui", bench_refresh_task_list),
+    "history_load": ("ui", bench_history_load),
+}
+
+def start_display(use_xvfb):
+    """A display for the ui group: $DISPLAY, or a private Xvfb server. Returns (Xvfb process, reason if none)"""
+    if os.name == "nt" or sys.platform == "darwin" or os.environ.get("DISPLAY"):
+        return None, None
+    if not use_xvfb:
+        return None, "no display (set DISPLAY or pass --xvfb)"
+    if shutil.which("Xvfb") is None:
+        return None, "Xvfb is not installed"
+    display = f":{random.randrange(100, 1000)}"
+    process = subprocess.Popen(["Xvfb", display, "-screen", "0", "1280x1024x24", "-nolisten", "tcp"],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.environ["DISPLAY"] = display
+    time.sleep(1)  # Give the server time to accept connections
+    if process.poll() is not None:
+        return None, "Xvfb failed to start"
+    return process, None
+
+def environment():
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], capture_output=True, text=True, check=True,
+                                  cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    import numpy
+    import pandas
+    return {
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "numpy": numpy.__version__,
+        "pandas": pandas.__version__,
+    }
+
+def run_benchmarks(sizes, names, repeat, use_xvfb=False, log=print):
+    """Run the named benchmarks at every size; returns the results document"""
+    results = []
+    skipped = {}
+    root = None
+    xvfb = None
+    if any(BENCHMARKS[name][0] == "ui" for name in names):
+        xvfb, reason = start_display(use_xvfb)
+        if reason is None:
+            import tkinter as tk
+            try:
+                root = tk.Tk()
+                root.geometry("1100x800")
+            except tk.TclError as e:
+                reason = f"cannot open a window: {e}"
+        if reason is not None:
+            for name in names:
+                if BENCHMARKS[name][0] == "ui":
+                    skipped[name] = reason
+            names = [name for name in names if name not in skipped]
+            log(f"Skipping the ui benchmarks: {reason}")
+    try:
+        for size in sizes:
+            directory = tempfile.mkdtemp(prefix=f"todo-bench-{size}-")
+            try:
+                log(f"Preparing {size} tasks...")
+                ctx = Context(size, directory, repeat)
+                for name in names:
+                    group, function = BENCHMARKS[name]
+                    times, ops = function(ctx, root) if group == "ui" else function(ctx)
+                    median = statistics.median(times)
+                    results.append({
+                        "name": name,
+                        "group": group,
+                        "size": size,
+                        "median": median,
+                        "min": min(times),
+                        "runs": times,
+                        "ops": ops,  # Operations per run; median / ops is the time per operation
+                    })
+                    log(f"  {name:<20} {size:>8}  {format_seconds(median / ops):>10}/op"
+                        f"  ({format_seconds(median)} per run)")
+                ctx.close()
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+    finally:
+        if root is not None:
+            root.destroy()
+        if xvfb is not None:
+            xvfb.terminate()
+            xvfb.wait()
+    return {"environment": environment(), "repeat": repeat, "results": results, "skipped": skipped}
+
+def format_seconds(seconds):
+    if seconds >= 1:
+        return f"{seconds:.2f} s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds * 1e6:.1f} us"
+
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD, out=sys.stdout):
+    """Print the change of every median against the baseline; returns the regressions"""
+    before = {(result["name"], result["size"]): result for result in baseline["results"]}
+    regressions = []
+    out.write(f"{'benchmark':<20} {'size':>8} {'baseline':>11} {'current':>11} {'change':>8}\n")
+    for result in current["results"]:
+        old = before.get((result["name"], result["size"]))
+        if old is None:
+            continue
+        change = result["median"] / old["median"] - 1 if old["median"] else 0.0
+        flag = ""
+        if change > threshold:
+            regressions.append(result)
+            flag = "  REGRESSION"
+        out.write(f"{result['name']:<20} {result['size']:>8} {format_seconds(old['median']):>11}"
+                  f" {format_seconds(result['median']):>11} {change:>+8.1%}{flag}\n")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the data, filter, reminder and list hot paths.")
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)),
+                        help="comma-separated task counts (default: %(default)s)")
+    parser.add_argument("--only", help="comma-separated benchmark names or groups (data, ui)")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--xvfb", action="store_true", help="start Xvfb for the ui benchmarks if there is no display")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="slowdown reported as a regression (default: %(default)s)")
+    parser.add_argument("--list", action="store_true", help="list the benchmarks and exit")
+    args = parser.parse_args(argv)
+    
+    if args.list:
+        for name, (group, function) in BENCHMARKS.items():
+            print(f"{name:<20} {group}")
+        return 0
+    names = list(BENCHMARKS)
+    if args.only:
+        wanted = set(args.only.split(","))
+        unknown = wanted - set(BENCHMARKS) - {"data", "ui"}
+        if unknown:
+            parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+        names = [name for name in names if name in wanted or BENCHMARKS[name][0] in wanted]
+    sizes = [int(size) for size in args.sizes.split(",")]
+    
+    document = run_benchmarks(sizes, names, args.repeat, args.xvfb)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(document, f, indent=1)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print()
+        if compare(baseline, document, args.threshold):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,3 @@
+def is_blank(value):
+    """Whether a task field is empty; empty Excel cells come through pandas as NaN"""
+    return value is None or value == "" or (isinstance(value, float) and value != value)
@@ -0,0 +1,272 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from database import DatabaseManager
+from backup_store import BackupStore
+from storage import TASK_COLUMNS
+from task_query import TaskQuery
+
+# The app's data directory, used unless --data-dir names another
+DATA_DIR = "data"
+
+# Same store the app logs to, so point-in-time restores see changes made from the command line
+BACKUP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backups", "store")
+
+# Tasks added or updated per batch; each batch costs one write per file, not one per task
+BATCH_SIZE = 5000
+
+# Least time between two progress lines
+PROGRESS_INTERVAL = 0.5
+
+# Columns of the list command's table output and their widths
+LIST_COLUMNS = [("Title", 30), ("Priority", 8), ("Category", 10), ("Status", 10), ("Due Date", 10), ("ID", 32)]
+
+class Progress:
+    """Progress lines on stderr; redrawn in place on a terminal, one line each otherwise"""
+    def __init__(self, label, total_bytes=None, quiet=False, stream=sys.stderr):
+        self.label = label
+        self.total_bytes = total_bytes
+        self.quiet = quiet
+        self.stream = stream
+        self.started = time.monotonic()
+        self._shown = 0
+        self._shown_count = None
+        self._end = "\r" if stream.isatty() else "\n"
+        
+    def update(self, count, done_bytes=None, final=False):
+        now = time.monotonic()
+        if self.quiet or (not final and now - self._shown < PROGRESS_INTERVAL):
+            return
+        if final and count == self._shown_count and self._end == "\n":
+            return  # Already the last line printed
+        self._shown = now
+        self._shown_count = count
+        rate = count / max(now - self.started, 1e-6)
+        percent = ""
+        if self.total_bytes and done_bytes is not None:
+            percent = f" {min(100, 100 * done_bytes // self.total_bytes):3d}%"
+        self.stream.write(f"{self.label}:{percent} {count} tasks ({rate:,.0f}/s)"
+                          + ("\n" if final else self._end))
+        self.stream.flush()
+        
+    def finish(self, count, done_bytes=None):
+        self.update(count, done_bytes, final=True)
+
+class ByteCounter:
+    """Text lines from a binary file, keeping count of the bytes read for progress"""
+    def __init__(self, f):
+        self.f = f
+        self.count = 0
+        
+    def __iter__(self):
+        for line in self.f:
+            self.count += len(line)
+            yield line.decode("utf-8-sig" if self.count == len(line) else "utf-8")
+
+def file_format(path, fmt):
+    if fmt:
+        return fmt
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        return "csv"
+    if extension in (".jsonl", ".json", ".ndjson"):
+        return "jsonl"
+    raise SystemExit(f"Cannot tell the format of {path}; pass --format csv or --format jsonl")
+
+def read_rows(lines, fmt):
+    """Task dicts streamed from CSV or JSON lines text"""
+    if fmt == "csv":
+        for row in csv.DictReader(lines):
+            yield {field: value for field, value in row.items() if field is not None}
+    else:
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+
+def batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def import_tasks(db, path, fmt, batch_size=BATCH_SIZE, replace=False, quiet=False):
+    """Stream tasks from a file in batches.
+    
+    Rows whose ID exists update that task, keeping the fields the row leaves
+    out; the other rows are added. Returns (added, updated).
+    """
+    fmt = file_format(path, fmt)
+    if replace:
+        db.clear_all_tasks()
+    source = sys.stdin.buffer if path == "-" else open(path, "rb")
+    progress = Progress("Importing", None if path == "-" else os.path.getsize(path), quiet)
+    lines = ByteCounter(source)
+    added = updated = 0
+    try:
+        for batch in batches(read_rows(lines, fmt), batch_size):
+            new, existing = [], []
+            seen = set()
+            for task in batch:
+                task_id = task.get("ID")
+                # A row repeating an ID from earlier in the batch updates the task that row added
+                if task_id and (task_id in db.table or task_id in seen):
+                    existing.append(task)
+                else:
+                    new.append(task)
+                    if task_id:
+                        seen.add(task_id)
+            added += len(db.add_tasks(new))
+            updated += db.update_tasks([dict(db.get_task(task["ID"]) or {}, **task) for task in existing])
+            progress.update(added + updated, lines.count)
+    finally:
+        if source is not sys.stdin.buffer:
+            source.close()
+    progress.finish(added + updated, lines.count)
+    return added, updated
+
+def export_tasks(db, path, fmt, quiet=False):
+    """Stream the tasks to a file, converting them a page at a time"""
+    fmt = file_format(path, fmt)
+    progress = Progress("Exporting", quiet=quiet)
+    target = sys.stdout if path == "-" else open(path, "w", encoding="utf-8", newline="")
+    count = 0
+    try:
+        if fmt == "csv":
+            writer = csv.DictWriter(target, fieldnames=list(TASK_COLUMNS), extrasaction="ignore")
+            writer.writeheader()
+        for record in db.iter_records():
+            if fmt == "csv":
+                writer.writerow(record)
+            else:
+                target.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            count += 1
+            if count % 1000 == 0:
+                progress.update(count)
+    finally:
+        if target is not sys.stdout:
+            target.close()
+    progress.finish(count)
+    return count
+
+def print_tasks(tasks, fmt, out=None):
+    # Looked up per call; a default bound at import would miss a redirected sys.stdout
+    out = out or sys.stdout
+    if fmt == "jsonl":
+        for task in tasks:
+            out.write(json.dumps(dict(task), ensure_ascii=False, default=str) + "\n")
+    elif fmt == "csv":
+        writer = csv.DictWriter(out, fieldnames=list(TASK_COLUMNS), extrasaction="ignore")
+        writer.writeheader()
+        for task in tasks:
+            writer.writerow(dict(task))
+    else:
+        out.write("  ".join(name.ljust(width) for name, width in LIST_COLUMNS).rstrip() + "\n")
+        for task in tasks:
+            out.write("  ".join(str(task[name])[:width].ljust(width) for name, width in LIST_COLUMNS).rstrip()
+                      + "\n")
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cli.py", description="Manage the to-do list without the window.")
+    parser.add_argument("--data-dir", default=DATA_DIR, help=f"data directory (default: {DATA_DIR})")
+    parser.add_argument("--backup-dir",
+                        help="backup store to log the changes to (default: the app's store for the default"
+                             " data directory, otherwise backups/store inside the data directory)")
+    parser.add_argument("--storage", choices=["snapshot", "sqlite"], default="snapshot")
+    parser.add_argument("--no-log", action="store_true",
+                        help="do not log the changes for point-in-time restores")
+    parser.add_argument("-q", "--quiet", action="store_true", help="no progress output")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    command = commands.add_parser("import", help="add or update tasks from a CSV or JSON lines file")
+    command.add_argument("path", help='file to read, or "-" for stdin')
+    command.add_argument("--format", choices=["csv", "jsonl"])
+    command.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    command.add_argument("--replace", action="store_true", help="delete the existing tasks first")
+    
+    command = commands.add_parser("export", help="write the tasks to a CSV or JSON lines file")
+    command.add_argument("path", help='file to write, or "-" for stdout')
+    command.add_argument("--format", choices=["csv", "jsonl"])
+    
+    command = commands.add_parser("list", help="show tasks")
+    command.add_argument("--search", default="")
+    command.add_argument("--priority", default="All")
+    command.add_argument("--category", default="All")
+    command.add_argument("--status", default="All")
+    command.add_argument("--sort", choices=list(TASK_COLUMNS), metavar="FIELD",
+                         help="field to sort by: " + ", ".join(TASK_COLUMNS))
+    command.add_argument("--desc", action="store_true", help="sort descending")
+    command.add_argument("--limit", type=int)
+    command.add_argument("--format", choices=["table", "csv", "jsonl"], default="table")
+    
+    command = commands.add_parser("add", help="add one task")
+    command.add_argument("title")
+    command.add_argument("--description", default="")
+    command.add_argument("--priority", default="Medium")
+    command.add_argument("--category", default="Other")
+    command.add_argument("--due", default="", help="due date, YYYY-MM-DD")
+    command.add_argument("--reminder", default="", help="reminder time, YYYY-MM-DD HH:MM")
+    
+    command = commands.add_parser("delete", help="delete tasks by ID")
+    command.add_argument("ids", nargs="+")
+    return parser
+
+def backup_dir(args):
+    """The store to log to; another data directory gets its own, away from the app's backups"""
+    if args.backup_dir:
+        return args.backup_dir
+    if os.path.abspath(args.data_dir) == os.path.abspath(DATA_DIR):
+        return BACKUP_DIR
+    return os.path.join(args.data_dir, "backups", "store")
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    status = 0
+    store = None if args.no_log else BackupStore(backup_dir(args))
+    db = DatabaseManager(storage=args.storage, data_dir=args.data_dir, backup_store=store,
+                         on_error=lambda title, message: print(message, file=sys.stderr))
+    try:
+        if args.command == "import":
+            added, updated = import_tasks(db, args.path, args.format, args.batch_size, args.replace, args.quiet)
+            print(f"Added {added} and updated {updated} tasks", file=sys.stderr)
+        elif args.command == "export":
+            count = export_tasks(db, args.path, args.format, args.quiet)
+            print(f"Exported {count} tasks", file=sys.stderr)
+        elif args.command == "list":
+            sort = [(args.sort, not args.desc)] if args.sort else ()
+            query = TaskQuery(priority=args.priority, category=args.category, status=args.status,
+                              sort=sort, limit=args.limit)
+            print_tasks(db.query_tasks(query, args.search), args.format)
+        elif args.command == "add":
+            task_id = db.add_task({
+                "Title": args.title,
+                "Description": args.description,
+                "Due Date": args.due,
+                "Priority": args.priority,
+                "Category": args.category,
+                "Status": "Pending",
+                "Reminder Time": args.reminder,
+            })
+            print(task_id)
+        elif args.command == "delete":
+            for task_id in args.ids:
+                if task_id not in db.table:
+                    print(f"No task with ID {task_id}", file=sys.stderr)
+                    status = 1
+                    continue
+                db.delete_task(task_id)
+    except BrokenPipeError:
+        # The reader went away, e.g. "cli.py export - | head"; stop quietly
+        sys.stdout = open(os.devnull, "w")
+    finally:
+        db.close()
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,104 +1,447 @@
-import pandas as pd
-from tkinter import messagebox
 import os
+import threading
+import uuid
+from datetime import datetime
+import numpy as np
+from storage import SnapshotBackend, SQLiteBackend, ExcelFormat, migrate_to_sqlite, replay_into
+from persistence import PersistenceWorker
+from history_store import HistoryCursor
+from backup_store import history_pages, diff_tasks
+from task_table import TaskTable, TaskList
+from search_index import lower_text
+from task_query import TaskQuery
+from instrumentation import timed
 
 class DatabaseManager:
-    def __init__(self, excel_file="tasks.xlsx", history_file="history.xlsx"):
+    def __init__(self, excel_file="tasks.xlsx", history_file="history.xlsx", use_journal=True,
+                 storage="snapshot", on_error=None, backup_store=None, data_dir="data"):
         # Create data directory if it doesn't exist
-        self.data_dir = "data"
+        self.data_dir = data_dir
         os.makedirs(self.data_dir, exist_ok=True)
         
-        # Set file paths in data directory
+        # Set file paths in data directory; the Excel files are only read to import older data
         self.excel_file = os.path.join(self.data_dir, excel_file)
         self.history_file = os.path.join(self.data_dir, history_file)
         
-        self.tasks = []
-        self.history_tasks = []
+        # Pick the storage backend; the SQLite one imports the snapshot data on first use
+        if storage == "sqlite":
+            db_file = os.path.join(self.data_dir, "tasks.db")
+            migrate_to_sqlite(self.excel_file, self.history_file, db_file)
+            self.backend = SQLiteBackend(db_file)
+        else:
+            # Journaled mode appends each mutation to a log instead of rewriting the snapshot
+            self.backend = SnapshotBackend(self.excel_file, self.history_file, use_journal)
+            
+        # Errors are handed to on_error(title, message) so the UI can show them on its own thread
+        self.on_error = on_error
+        
+        # _lock guards the in-memory lists; snapshot writes happen on the persistence worker
+        self._lock = threading.RLock()
+        self.writer = PersistenceWorker(
+            on_error=lambda name, e: self._report_error(f"Error saving {name}: {str(e)}"))
+        
+        # Bumped by every change to the tasks or history, so automatic backups can tell idle periods
+        self.changes = 0
+        
+        # Full saves queued, and those whose write has reached the backend; the backend only
+        # answers queries while the two are equal, since until then it holds older tasks
+        self._saves = 0
+        self._saved = 0
+        
+        # BackupStore that logs every change with its time, for point-in-time restores
+        self.backup_store = backup_store
+        
+        # Tasks in columnar form, in list order; read through TaskRow views
+        self.table = TaskTable()
+        self._task_list = None
         self.load_tasks()
-        self.load_history()
         
+    @property
+    def tasks(self):
+        """The tasks in list order; rebuilt after a mutation the next time it is read"""
+        with self._lock:
+            if self._task_list is None:
+                self._task_list = self.table.rows()
+            return self._task_list
+            
+    @staticmethod
+    def new_task_id():
+        return uuid.uuid4().hex
+        
+    def _assign_ids(self, tasks, unique=True):
+        # Give rows saved before tasks had IDs (or duplicated by hand in Excel) a fresh one
+        changed = False
+        seen = set()
+        for task in tasks:
+            task_id = task.get("ID")
+            if not isinstance(task_id, str) or not task_id or (unique and task_id in seen):
+                task["ID"] = self.new_task_id()
+                changed = True
+            seen.add(task["ID"])
+        return changed
+        
+    @timed("db.load_tasks")
     def load_tasks(self):
-        if os.path.exists(self.excel_file):
-            try:
-                df = pd.read_excel(self.excel_file)
-                # Ensure Reminder Time column exists
-                if 'Reminder Time' not in df.columns:
-                    df['Reminder Time'] = ''
-                self.tasks = df.to_dict("records")
-            except Exception as e:
-                messagebox.showerror("Error", f"Error loading tasks: {str(e)}")
-                self.tasks = []
-        else:
-            self.tasks = []
+        try:
+            # A mapped snapshot is adopted as it is, so startup does not parse the tasks
+            mapped = self.backend.map_tasks()
+            tasks = None if mapped else self.backend.load_tasks()
+        except Exception as e:
+            self._report_error(f"Error loading tasks: {str(e)}")
+            mapped = None
+            tasks = []
+        if mapped:
+            snapshot, records = mapped
+            with self._lock:
+                self.table.load_mapped(snapshot)
+                replay_into(self.table, records)
+                self._task_list = None
+            return
+        assigned = self._assign_ids(tasks)
+        with self._lock:
+            self.table.load(tasks)
+            self._task_list = None
+        if assigned or self.backend.imported:
+            # Persist the new IDs (and an imported file in the backend's own format) right away,
+            # so journal records can refer to them
+            self.save_tasks()
             
+    @timed("db.load_history")
     def load_history(self):
-        if os.path.exists(self.history_file):
-            try:
-                df = pd.read_excel(self.history_file)
-                # Ensure Reminder Time column exists
-                if 'Reminder Time' not in df.columns:
-                    df['Reminder Time'] = ''
-                self.history_tasks = df.to_dict("records")
-            except Exception as e:
-                messagebox.showerror("Error", f"Error loading history: {str(e)}")
-                self.history_tasks = []
+        """Recount the history; its rows are only read when a page of them is shown"""
+        try:
+            with self._lock:
+                self.backend.reload_history()
+        except Exception as e:
+            self._report_error(f"Error loading history: {str(e)}")
+            
+    def _report_error(self, message):
+        if self.on_error:
+            self.on_error("Error", message)
         else:
-            self.history_tasks = []
+            print(message)
             
+    @timed("db.save_tasks")
     def save_tasks(self):
+        """Queue a full write of the tasks; a burst of calls collapses into one write"""
+        with self._lock:
+            self._saves += 1
+        self.writer.submit("tasks", self._write_tasks)
+            
+    def _copy_for_save(self):
+        # Runs on the persistence worker: copy the latest state, then write without the lock
+        with self._lock:
+            if os.name == "nt":
+                # Windows cannot replace a snapshot file that this process still has mapped
+                self.table.detach()
+            return self.table.to_records(), self.backend.checkpoint()
+            
+    @timed("db.write_tasks")
+    def _write_tasks(self):
+        with self._lock:
+            saves = self._saves
+            tasks, checkpoint = self._copy_for_save()
+        self.backend.save_tasks(tasks, checkpoint)
+        self._saved = saves
+        
+    @timed("db.compact")
+    def _compact(self):
+        self.backend.compact(*self._copy_for_save())
+            
+    def compact(self):
+        """Fold pending changes into the backend's main files and wait, e.g. before a backup"""
+        self.writer.submit("compact", self._compact)
+        self.flush()
+        
+    @timed("db.flush")
+    def flush(self):
+        """Wait until every queued write has reached the disk"""
+        self.writer.flush()
+            
+    def _maybe_compact(self):
+        if self.backend.needs_compaction(len(self.table)):
+            self.writer.submit("compact", self._compact)
+        
+    def _record_task(self, op, **fields):
+        # Called with _lock held so records reach the backend in the order they were applied
         try:
-            df = pd.DataFrame(self.tasks)
-            df.to_excel(self.excel_file, index=False)
+            self.backend.record_task(op, **fields)
         except Exception as e:
-            messagebox.showerror("Error", f"Error saving tasks: {str(e)}")
-            
-    def save_history(self):
+            self._report_error(f"Error saving tasks: {str(e)}")
+        self._maybe_compact()
+        
+    def _record_tasks(self, op, tasks):
         try:
-            df = pd.DataFrame(self.history_tasks)
-            df.to_excel(self.history_file, index=False)
+            self.backend.record_tasks(op, tasks)
         except Exception as e:
-            messagebox.showerror("Error", f"Error saving history: {str(e)}")
+            self._report_error(f"Error saving tasks: {str(e)}")
+        self._maybe_compact()
+        
+    def _record_history(self, op, **fields):
+        try:
+            self.backend.record_history(op, **fields)
+        except Exception as e:
+            self._report_error(f"Error saving history: {str(e)}")
+        self._maybe_compact()
+            
+    def reminders(self):
+        """(task IDs, reminder times as datetime64) of the unfinished tasks that have a reminder"""
+        with self._lock:
+            return self.table.reminders()
             
+    def get_task(self, task_id):
+        return self.table.row(task_id) if task_id in self.table else None
+        
+    @timed("db.add_task")
     def add_task(self, task):
-        self.tasks.append(task)
+        """Add a task, giving it an ID if it has none, and return the ID"""
+        with self._lock:
+            if not task.get("ID"):
+                task["ID"] = self.new_task_id()
+            self.table.append(task)
+            self._task_list = None
+            self._changed("add", task=dict(task))
+            # Also add to history, which is always appended to rather than rewritten
+            self._record_history("add", task=dict(task))
+            if self.backend.incremental:
+                self._record_task("add", task=task)
+                return task["ID"]
         self.save_tasks()
-        # Also add to history
-        self.history_tasks.append(task)
-        self.save_history()
+        return task["ID"]
         
-    def update_task(self, index, task):
-        if 0 <= index < len(self.tasks):
-            self.tasks[index] = task
-            self.save_tasks()
+    @timed("db.add_tasks")
+    def add_tasks(self, tasks):
+        """Add a batch of tasks, writing each file once for the batch rather than once per task.
+        
+        Tasks without an ID get one; returns the IDs.
+        """
+        with self._lock:
+            for task in tasks:
+                if not task.get("ID"):
+                    task["ID"] = self.new_task_id()
+            self.table.extend(tasks)
+            self._task_list = None
+            self._changed_many("add", [{"task": dict(task)} for task in tasks])
+            try:
+                self.backend.extend_history([dict(task) for task in tasks])
+            except Exception as e:
+                self._report_error(f"Error saving history: {str(e)}")
+            ids = [task["ID"] for task in tasks]
+            if self.backend.incremental:
+                self._record_tasks("add", tasks)
+                return ids
+        self.save_tasks()
+        return ids
+        
+    @timed("db.update_tasks")
+    def update_tasks(self, tasks):
+        """Overwrite a batch of tasks, matched by their ID; tasks that no longer exist are skipped"""
+        with self._lock:
+            tasks = [task for task in tasks if task.get("ID") in self.table]
+            for task in tasks:
+                self.table.update(task["ID"], task)
+            self._task_list = None
+            self._changed_many("update", [{"id": task["ID"], "task": dict(task)} for task in tasks])
+            if self.backend.incremental:
+                self._record_tasks("update", tasks)
+                return len(tasks)
+        self.save_tasks()
+        return len(tasks)
+        
+    def iter_records(self, page=10000):
+        """The tasks as plain dicts in list order, converted a page at a time, e.g. for streaming exports"""
+        with self._lock:
+            rows = self.table.live_rows()
+            version = self.table.version
+        for start in range(0, len(rows), page):
+            with self._lock:
+                if self.table.version != version:
+                    raise RuntimeError("The tasks changed while they were being read")
+                records = self.table.to_records(rows[start:start + page])
+            yield from records
+        
+    @timed("db.update_task")
+    def update_task(self, task_id, task):
+        with self._lock:
+            if task_id not in self.table:
+                return
+            task["ID"] = task_id
+            self.table.update(task_id, task)
+            self._changed("update", id=task_id, task=dict(task))
+            self._task_list = None
+            if self.backend.incremental:
+                self._record_task("update", task_id=task_id, task=task)
+                return
+        self.save_tasks()
             
-    def delete_task(self, index):
-        if 0 <= index < len(self.tasks):
-            del self.tasks[index]
-            self.save_tasks()
+    @timed("db.delete_task")
+    def delete_task(self, task_id):
+        with self._lock:
+            if task_id not in self.table:
+                return
+            self.table.delete(task_id)
+            self._task_list = None
+            self._changed("delete", id=task_id)
+            if self.backend.incremental:
+                self._record_task("delete", task_id=task_id)
+                return
+        self.save_tasks()
             
     def get_all_tasks(self):
         return self.tasks
         
     def get_all_history_tasks(self):
-        return self.history_tasks
-        
-    def filter_tasks(self, search_text="", priority="All", category="All"):
-        filtered_tasks = []
-        search_text = search_text.lower()
-        
-        for task in self.tasks:
-            if (search_text in task["Title"].lower() or 
-                search_text in task["Description"].lower()) and \
-               (priority == "All" or task["Priority"] == priority) and \
-               (category == "All" or task["Category"] == category):
-                filtered_tasks.append(task)
+        """Lazy view of the history, oldest first; rows are read a chunk at a time when indexed"""
+        return HistoryCursor(self.history_count, self.read_history)
+        
+    def history_count(self):
+        with self._lock:
+            return self.backend.history_count()
+            
+    @timed("db.read_history")
+    def read_history(self, start, count):
+        with self._lock:
+            return self.backend.read_history(start, count)
+            
+    @timed("db.export_tasks")
+    def export_tasks(self, path):
+        """Write the tasks to an Excel file"""
+        with self._lock:
+            tasks = self.table.to_records()
+        ExcelFormat().write(path, tasks)
+        
+    @timed("db.import_tasks")
+    def import_tasks(self, path):
+        """Replace the tasks with the rows of an Excel file and save them right away"""
+        tasks, _ = ExcelFormat().read(path)
+        self._assign_ids(tasks)
+        with self._lock:
+            self.table.load(tasks)
+            self._task_list = None
+            self._reset()
+        self.save_tasks()
+        self.flush()
+        
+    @timed("db.backup")
+    def backup(self, store, pace=None):
+        """Take an incremental backup into a BackupStore; returns its manifest, or None if nothing changed"""
+        with self._lock:
+            table = self.table.copy()
+            count = self.backend.history_count()
+            as_of = datetime.now()
+            # Only the store this manager logs to can replay the backup forward
+            position = store.log_position() if store is self.backup_store else None
+        # The copy holds only the columns; building the records from it leaves the lock free for the UI.
+        # History is append-only and history_pages stops at count, so the pages read after the lock is
+        # released hold exactly the rows counted under it; later rows are replayed from the change log
+        tasks = table.to_records()
+        return store.backup(tasks, history_pages(count, self.read_history), count, pace, as_of, position)
+        
+    @timed("db.preview_restore")
+    def preview_restore(self, store, when):
+        """Rebuild the tasks and history as of the datetime when, without applying them.
+        
+        Returns (tasks, history rows, (added, removed, changed)); the diff is
+        what restore_state(tasks, history) would do to the current tasks.
+        """
+        tasks, history_tasks = store.state_at(when)
+        with self._lock:
+            current = self.table.to_records()
+        return tasks, history_tasks, diff_tasks(current, tasks)
+        
+    @timed("db.restore_state")
+    def restore_state(self, tasks, history_tasks):
+        """Replace the tasks and history together and save them right away"""
+        with self._lock:
+            self.table.load(tasks)
+            self._task_list = None
+            self.backend.save_history(history_tasks)
+            self._reset()
+        self.save_tasks()
+        self.flush()
+        
+    def _changed(self, op, **fields):
+        # Called with _lock held, so the change log has the changes in the order they were applied
+        self.changes += 1
+        if self.backup_store is not None:
+            try:
+                self.backup_store.record(op, **fields)
+            except Exception as e:
+                self._report_error(f"Error logging change: {str(e)}")
                 
-        return filtered_tasks 
-
+    def _changed_many(self, op, records):
+        self.changes += len(records)
+        if self.backup_store is not None:
+            try:
+                self.backup_store.record_many(op, records)
+            except Exception as e:
+                self._report_error(f"Error logging change: {str(e)}")
+                
+    def _reset(self):
+        # The data was replaced wholesale; log it as a reset to a backup holding the new state
+        self.changes += 1
+        store = self.backup_store
+        if store is None:
+            return
+        try:
+            manifest = self.backup(store) or store.latest()
+            store.record("reset", backup=manifest["id"])
+        except Exception as e:
+            self._report_error(f"Error logging change: {str(e)}")
+        
+    def filter_tasks(self, search_text="", priority="All", category="All", sort=()):
+        return self.query_tasks(TaskQuery(priority=priority, category=category, sort=sort), search_text)
+        
+    @timed("db.query_tasks")
+    def query_tasks(self, query, search_text=""):
+        """Run a TaskQuery over the table, narrowed to tasks containing search_text.
+        
+        A backend with indexes of its own (SQLite) picks the matching tasks;
+        the table still sorts and pages them.
+        """
+        with self._lock:
+            ids = self.backend.query_tasks(query, search_text) if self._saved == self._saves else None
+            if ids is not None:
+                mask = self.table.id_mask(ids)
+            else:
+                mask = self.table.text_mask(search_text) if search_text else None
+            return query.run(self.table, mask)
+                       
+    @timed("db.refine_tasks")
+    def refine_tasks(self, previous, search_text):
+        """Narrow an earlier result to the tasks containing search_text, keeping its order.
+        
+        Only the rows of the earlier result are checked. Returns None when the
+        table has changed since, and the query has to be run from scratch.
+        """
+        with self._lock:
+            if not isinstance(previous, TaskList) or previous.version != self.table.version:
+                return None
+            search_text = search_text.lower()
+            rows = previous.rows
+            keep = [search_text in lower_text(title) or search_text in lower_text(description)
+                    for title, description in zip(self.table.column("Title")[rows],
+                                                  self.table.column("Description")[rows])]
+            return self.table.take(rows[np.array(keep, dtype=bool)])
+            
+    @timed("db.clear_all_tasks")
     def clear_all_tasks(self):
-        self.tasks = []
+        with self._lock:
+            self.table.clear()
+            self._task_list = None
+            self._changed("clear")
+            if self.backend.incremental:
+                self._record_task("clear")
+                return
         self.save_tasks()
         
+    @timed("db.clear_all_history")
     def clear_all_history(self):
-        self.history_tasks = []
-        self.save_history() 
\ No newline at end of file
+        with self._lock:
+            self._changed("history_clear")
+            self._record_history("clear")
+                
+    def close(self):
+        """Flush queued writes and release the backend; the app's exit hook"""
+        self.writer.stop()
+        self.backend.close()
\ No newline at end of file
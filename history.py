@@ -1,11 +1,40 @@
 import tkinter as tk
+from collections.abc import Sequence
 from tkinter import ttk, messagebox
 from database import DatabaseManager
+from task_view import VirtualTreeview, TASK_COLUMNS, task_values
+from instrumentation import timed
+
+class NumberedRows(Sequence):
+    """(position, row) pairs of a history view.
+    
+    History is append-only, so a row's position identifies it until the
+    history is cleared, unlike the dict read for it, which is a new object
+    every time its chunk is loaded again.
+    """
+    def __init__(self, rows):
+        self.rows = rows
+        
+    def __len__(self):
+        return len(self.rows)
+        
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            return list(zip(range(start, stop, step), self.rows[start:stop:step]))
+        if key < 0:
+            key += len(self)
+        return key, self.rows[key]
+
+def history_key(entry):
+    position, task = entry
+    return position, task.get("ID")
 
 class HistoryPage:
     def __init__(self, main_container, db_manager):
         self.main_container = main_container
         self.db_manager = db_manager
+        self.loaded_changes = None  # db_manager.changes as of the last load
         self.create_history_page()
         
     def create_history_page(self):
@@ -46,49 +75,35 @@ class HistoryPage:
                  background=[('active', '#1F7CC3')],
                  foreground=[('active', 'white')])
 
-        # Create Treeview
-        columns = ("Title", "Description", "Date", "Reminder Time", "Priority", "Category", "Status")
-        self.history_tree = ttk.Treeview(list_frame, columns=columns, show="headings", style="Custom.Treeview")
+        # Create Treeview; only the rows in view are materialized as items
+        columns = TASK_COLUMNS
+        self.history_view = VirtualTreeview(list_frame, columns, lambda entry: task_values(entry[1]),
+                                            key_for=history_key, style="Custom.Treeview")
+        self.history_tree = self.history_view.tree
         
         # Set column headings
         for col in columns:
             self.history_tree.heading(col, text=col, anchor="w")
             self.history_tree.column(col, width=150, anchor="w")
         
-        # Add scrollbar
-        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.history_tree.yview)
-        self.history_tree.configure(yscrollcommand=scrollbar.set)
-        
-        # Pack widgets
+        # Pack widgets (the view drives its own scrollbar)
         self.history_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.history_view.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
         # Load history
         self.load_history()
         
+    @timed("history.load")
     def load_history(self):
         """Load task history from database"""
-        # Clear existing items
-        for item in self.history_tree.get_children():
-            self.history_tree.delete(item)
-            
-        # Load history tasks from database
-        self.db_manager.load_history()  # Reload history from Excel
-        tasks = self.db_manager.get_all_history_tasks()
-        
-        # Add tasks to history
-        for task in tasks:
-            values = (
-                task["Title"],
-                task["Description"],
-                task["Due Date"],
-                task.get("Reminder Time", ""),
-                task["Priority"],
-                task["Category"],
-                task["Status"]
-            )
+        self.loaded_changes = self.db_manager.changes
+        self.db_manager.load_history()  # Recount the history; rows are read as they scroll into view
+        self.history_view.set_rows(NumberedRows(self.db_manager.get_all_history_tasks()))
             
-            self.history_tree.insert("", tk.END, values=values)
+    def sync(self):
+        """Reload the history if the data has changed since it was last loaded"""
+        if self.db_manager.changes != self.loaded_changes:
+            self.load_history()
             
     def refresh_history(self):
         self.load_history()
@@ -99,6 +114,5 @@ class HistoryPage:
             # Clear the history database
             self.db_manager.clear_all_history()
             # Clear the treeview
-            for item in self.history_tree.get_children():
-                self.history_tree.delete(item)
+            self.history_view.set_rows([])
             messagebox.showinfo("Success", "All task history has been cleared!") 
\ No newline at end of file
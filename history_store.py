@@ -0,0 +1,217 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from cells import is_blank
+
+# Rows per chunk file; every chunk but the last is always full
+CHUNK_SIZE = 1000
+
+# Decoded chunks kept in memory, enough for the rows around the visible window
+CACHE_CHUNKS = 4
+
+def clean_row(task):
+    # NaN is not valid JSON
+    return {field: "" if is_blank(value) else value for field, value in task.items()}
+
+class HistoryStore:
+    """Append-only task history split into fixed-size JSONL chunk files.
+    
+    Only the row count is known up front. Rows are read on demand, a chunk
+    at a time, and the most recently used chunks stay decoded in memory.
+    Adding a task appends one line to the last chunk instead of rewriting
+    the whole history. drop_before() deletes leading chunks without
+    renumbering the rows after them.
+    """
+    def __init__(self, directory, chunk_size=CHUNK_SIZE):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self._lock = threading.RLock()
+        self._cache = OrderedDict()  # chunk number -> decoded rows, least recently used first
+        self._file = None  # Append handle on the last chunk
+        self._count = 0
+        self._first = 0  # Number of the first chunk still on disk
+        self.reload()
+        
+    def _chunk_path(self, number):
+        return os.path.join(self.directory, f"chunk-{number:06d}.jsonl")
+        
+    def exists(self):
+        return os.path.isdir(self.directory)
+        
+    def reload(self):
+        """Recount the rows, e.g. after the chunk files were replaced"""
+        with self._lock:
+            self._close_file()
+            self._cache.clear()
+            self._first = self._first_chunk()
+            chunks = self._first
+            if self.exists():
+                while os.path.exists(self._chunk_path(chunks)):
+                    chunks += 1
+            if chunks == self._first:
+                self._count = 0
+                self._first = 0
+                return
+            # Only the last chunk can be partly filled
+            last = self._chunk_path(chunks - 1)
+            with open(last, "rb") as f:
+                data = f.read()
+            if data and not data.endswith(b"\n"):
+                # A torn write left behind by a crash; drop the partial line
+                data = data[:data.rfind(b"\n") + 1]
+                with open(last, "wb") as f:
+                    f.write(data)
+            self._count = (chunks - 1) * self.chunk_size + data.count(b"\n")
+            
+    def _first_chunk(self):
+        if not self.exists():
+            return 0
+        numbers = [int(name[6:-6]) for name in os.listdir(self.directory)
+                   if name.startswith("chunk-") and name.endswith(".jsonl")]
+        return min(numbers, default=0)
+            
+    def __len__(self):
+        return self._count
+        
+    def append(self, task):
+        self.extend([task])
+        
+    def extend(self, tasks):
+        """Append rows, flushing once at the end rather than once per row"""
+        with self._lock:
+            for task in tasks:
+                number, offset = divmod(self._count, self.chunk_size)
+                if offset == 0:
+                    # The last chunk is full; start the next one
+                    self._close_file()
+                    os.makedirs(self.directory, exist_ok=True)
+                if self._file is None:
+                    self._file = open(self._chunk_path(number), "a", encoding="utf-8")
+                row = clean_row(task)
+                self._file.write(json.dumps(row, default=str) + "\n")
+                self._count += 1
+                if number in self._cache:
+                    self._cache[number].append(row)
+            if self._file is not None:
+                self._file.flush()
+                
+    def replace(self, tasks):
+        """Rewrite the history from a full list, e.g. when importing a backup"""
+        with self._lock:
+            self.clear()
+            os.makedirs(self.directory, exist_ok=True)
+            rows = [clean_row(task) for task in tasks]
+            for number, start in enumerate(range(0, len(rows), self.chunk_size)):
+                path = self._chunk_path(number)
+                with open(path + ".tmp", "w", encoding="utf-8") as f:
+                    for row in rows[start:start + self.chunk_size]:
+                        f.write(json.dumps(row, default=str) + "\n")
+                os.replace(path + ".tmp", path)
+            self._count = len(rows)
+            
+    def clear(self):
+        with self._lock:
+            self._close_file()
+            self._cache.clear()
+            number = self._first
+            while os.path.exists(self._chunk_path(number)):
+                os.remove(self._chunk_path(number))
+                number += 1
+            self._count = 0
+            self._first = 0
+            
+    def drop_before(self, position):
+        """Delete the full chunks that only hold rows before position; later rows keep their positions"""
+        with self._lock:
+            # The last chunk is kept even if it is full, so the count survives a reload
+            last = max(0, (self._count - 1) // self.chunk_size)
+            stop = min(position // self.chunk_size, last)
+            for number in range(self._first, stop):
+                self._cache.pop(number, None)
+                os.remove(self._chunk_path(number))
+            self._first = max(self._first, stop)
+            
+    def read(self, start, count):
+        """Rows start to start + count, in the order they were added"""
+        with self._lock:
+            stop = min(start + count, self._count)
+            rows = []
+            while start < stop:
+                number, offset = divmod(start, self.chunk_size)
+                chunk = self._load_chunk(number)
+                taken = chunk[offset:offset + stop - start]
+                if not taken:
+                    break
+                rows.extend(taken)
+                start += len(taken)
+            return rows
+            
+    def _load_chunk(self, number):
+        chunk = self._cache.get(number)
+        if chunk is not None:
+            self._cache.move_to_end(number)
+            return chunk
+        chunk = []
+        path = self._chunk_path(number)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                chunk = [json.loads(line) for line in f if line.strip()]
+        self._cache[number] = chunk
+        if len(self._cache) > CACHE_CHUNKS:
+            self._cache.popitem(last=False)
+        return chunk
+        
+    def cursor(self, start=0):
+        return HistoryCursor(self.__len__, self.read, start)
+        
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            
+    def close(self):
+        with self._lock:
+            self._close_file()
+
+class HistoryCursor:
+    """Read-only, lazily loaded view of a history store.
+    
+    It behaves as a sequence, so VirtualTreeview can slice it as the user
+    scrolls and only the rows in view are read. fetch() walks it page by
+    page for sequential readers such as the backup log replay.
+    """
+    def __init__(self, count, read, start=0):
+        self._count = count  # () -> number of rows
+        self._read = read  # (start, count) -> rows
+        self.position = start
+        
+    def __len__(self):
+        return self._count()
+        
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            rows = self._read(start, max(0, stop - start))
+            return rows[::step] if step != 1 else rows
+        if key < 0:
+            key += len(self)
+        rows = self._read(key, 1)
+        if not rows:
+            raise IndexError("history index out of range")
+        return rows[0]
+        
+    def __iter__(self):
+        position = 0
+        while True:
+            rows = self._read(position, CHUNK_SIZE)
+            if not rows:
+                return
+            yield from rows
+            position += len(rows)
+            
+    def fetch(self, count=CHUNK_SIZE):
+        """Next page of rows from the current position"""
+        rows = self._read(self.position, count)
+        self.position += len(rows)
+        return rows
@@ -0,0 +1,247 @@
+import bisect
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# Environment variable that switches instrumentation on from startup, e.g. TODO_INSTRUMENT=1
+ENV_VAR = "TODO_INSTRUMENT"
+
+# Spans kept for the trace dump; older ones are dropped first
+MAX_SPANS = 100000
+
+# Upper bounds of the histogram buckets in milliseconds; one more bucket holds everything slower
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# How often the main-loop monitor asks Tk for a tick
+LOOP_INTERVAL_MS = 100
+
+class Histogram:
+    """Durations in milliseconds, counted into BUCKETS_MS"""
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, ms):
+        self.buckets[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    def percentile(self, p):
+        """Upper bound of the bucket holding the p-th percentile; the maximum for the open bucket"""
+        rank = p / 100 * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return min(BUCKETS_MS[index], self.max) if index < len(BUCKETS_MS) else self.max
+        return 0.0
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "total_ms": self.total,
+            "mean_ms": self.total / self.count if self.count else 0.0,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "max_ms": self.max,
+        }
+
+class _Span:
+    __slots__ = ("instruments", "name", "started")
+
+    def __init__(self, instruments, name):
+        self.instruments = instruments
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.instruments._record(self.name, self.started, time.perf_counter())
+        return False
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NO_SPAN = _NoSpan()
+
+class Instrumentation:
+    """Opt-in timing spans, counters and histograms around the hot paths.
+
+    While disabled, span() returns a shared no-op context manager and
+    timed() wrappers, count() and observe() return after one attribute
+    check, so instrumented code costs next to nothing. While enabled, every
+    span adds its duration to the histogram of its name and is kept (up to
+    MAX_SPANS) for write_trace, whose Chrome trace-event file
+    chrome://tracing, Perfetto and speedscope show as a flame chart.
+    """
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.counters = {}  # name -> count
+        self.histograms = {}  # name -> Histogram of durations
+        self._spans = deque(maxlen=MAX_SPANS)  # (name, thread id, start, end) in perf_counter seconds
+        self._threads = {}  # thread id -> name, for the trace
+        self._lock = threading.Lock()
+        self._epoch = time.perf_counter()
+        self._profiler = None
+        self._loop = None  # (root, after() id) of the main-loop monitor
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self._spans.clear()
+            self._threads.clear()
+
+    def span(self, name):
+        """Context manager timing its block under name"""
+        if not self.enabled:
+            return _NO_SPAN
+        return _Span(self, name)
+
+    def timed(self, name):
+        """Decorator timing every call of a function under name"""
+        def decorate(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                started = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self._record(name, started, time.perf_counter())
+            return wrapper
+        return decorate
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name, ms):
+        """Add a duration in milliseconds that was measured some other way"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._histogram(name).add(ms)
+
+    def _histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        return histogram
+
+    def _record(self, name, started, ended):
+        thread = threading.current_thread()
+        with self._lock:
+            self._histogram(name).add((ended - started) * 1000)
+            self._spans.append((name, thread.ident, started, ended))
+            self._threads[thread.ident] = thread.name
+
+    def snapshot(self):
+        """Counters and histogram summaries as plain data"""
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "histograms": {name: histogram.summary() for name, histogram in self.histograms.items()},
+            }
+
+    def report(self):
+        """Text table of the histograms, most total time first, then the counters"""
+        snapshot = self.snapshot()
+        lines = [f"{'span':<28} {'count':>8} {'total ms':>11} {'mean':>9} {'p95':>9} {'max':>9}"]
+        for name, s in sorted(snapshot["histograms"].items(), key=lambda item: -item[1]["total_ms"]):
+            lines.append(f"{name:<28} {s['count']:>8} {s['total_ms']:>11.1f} {s['mean_ms']:>9.2f}"
+                         f" {s['p95_ms']:>9.2f} {s['max_ms']:>9.2f}")
+        if snapshot["counters"]:
+            lines.append("")
+            lines += [f"{name:<28} {count:>8}" for name, count in sorted(snapshot["counters"].items())]
+        return "\n".join(lines)
+
+    def write_trace(self, path):
+        """Write the kept spans as a Chrome trace-event JSON file; returns the number of spans"""
+        with self._lock:
+            spans = list(self._spans)
+            threads = dict(self._threads)
+        pid = os.getpid()
+        events = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                  for tid, name in threads.items()]
+        for name, tid, started, ended in spans:
+            events.append({"name": name, "ph": "X", "pid": pid, "tid": tid,
+                           "ts": (started - self._epoch) * 1e6, "dur": (ended - started) * 1e6})
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return len(spans)
+
+    def start_profile(self):
+        """Start cProfile on the calling thread; False if it is already running"""
+        if self._profiler is not None:
+            return False
+        self._profiler = cProfile.Profile()
+        self._profiler.enable()
+        return True
+
+    def stop_profile(self, path=None):
+        """Stop the profiler and write its stats to path (pstats format, e.g. for snakeviz or flameprof)"""
+        profiler, self._profiler = self._profiler, None
+        if profiler is None:
+            return False
+        profiler.disable()
+        if path:
+            profiler.dump_stats(path)
+        return True
+
+    @property
+    def profiling(self):
+        return self._profiler is not None
+
+    def watch_main_loop(self, root, interval_ms=LOOP_INTERVAL_MS):
+        """Record how late each root.after tick runs as the "mainloop.lag" histogram"""
+        self.stop_watching()
+        interval = interval_ms / 1000
+
+        def tick(expected):
+            now = time.perf_counter()
+            self.observe("mainloop.lag", max(0.0, now - expected) * 1000)
+            self._loop = (root, root.after(interval_ms, tick, now + interval))
+
+        self._loop = (root, root.after(interval_ms, tick, time.perf_counter() + interval))
+
+    def stop_watching(self):
+        if self._loop is None:
+            return
+        root, job = self._loop
+        self._loop = None
+        try:
+            root.after_cancel(job)
+        except Exception:
+            pass  # The window is already gone
+
+# The process-wide instance the modules are instrumented with
+instruments = Instrumentation(enabled=os.environ.get(ENV_VAR, "") not in ("", "0"))
+timed = instruments.timed
+span = instruments.span
+count = instruments.count
@@ -0,0 +1,89 @@
+import json
+import os
+import threading
+
+class Journal:
+    """Append-only log of task mutations, one JSON record per line"""
+    def __init__(self, path):
+        self.path = path
+        self.seq = 0  # Sequence number of the last record written
+        self.length = 0  # Number of records currently in the log
+        self._file = None
+        self._lock = threading.Lock()
+        
+    def append(self, op, **fields):
+        with self._lock:
+            self.seq += 1
+            record = dict(fields, op=op, seq=self.seq)
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(json.dumps(record, default=str) + "\n")
+            self._file.flush()
+            self.length += 1
+            return record
+            
+    def extend(self, op, records):
+        """Append one record per dict of fields, flushing once for the whole batch"""
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            written = []
+            for fields in records:
+                self.seq += 1
+                record = dict(fields, op=op, seq=self.seq)
+                self._file.write(json.dumps(record, default=str) + "\n")
+                written.append(record)
+            self._file.flush()
+            self.length += len(written)
+            return written
+            
+    def read(self, after_seq=0):
+        """Return the records with a sequence number greater than after_seq"""
+        records = []
+        if not os.path.exists(self.path):
+            return records
+            
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn write at the tail of the log, left behind by a crash
+                    break
+                if record["seq"] > after_seq:
+                    records.append(record)
+        return records
+        
+    def recover(self, snapshot_seq):
+        """Return the records to replay on top of the snapshot and line up the counters"""
+        with self._lock:
+            records = self.read(snapshot_seq)
+            last_seq = records[-1]["seq"] if records else 0
+            self.seq = max(self.seq, snapshot_seq, last_seq)
+            self.length = len(records)
+            return records
+            
+    def truncate(self, upto_seq):
+        """Drop the records that have been folded into the snapshot"""
+        with self._lock:
+            keep = self.read(upto_seq)
+            self._close_file()
+            
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for record in keep:
+                    f.write(json.dumps(record, default=str) + "\n")
+            os.replace(tmp_path, self.path)
+            self.length = len(keep)
+            
+    def close(self):
+        with self._lock:
+            self._close_file()
+            
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
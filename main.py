@@ -1,14 +1,37 @@
+import time
+
+# Taken before the imports below, so the startup times include them
+STARTED = time.perf_counter()
+
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-from tkcalendar import DateEntry
-from ttkthemes import ThemedTk
-from datetime import datetime
-import shutil
+from datetime import datetime, timedelta
 import os
+import threading
+from collections import deque
 from theme import ThemeManager, CustomCombobox
-from database import DatabaseManager
+from backup_store import BackupStore
+from backup_scheduler import BackupScheduler
 from notifications import NotificationManager
-from history import HistoryPage
+from task_view import VirtualTreeview, TASK_COLUMNS, task_values
+from search_pipeline import SearchPipeline, narrows
+from instrumentation import instruments, timed
+from stall_watchdog import MainLoopWatchdog
+
+# Most added, removed and changed tasks each listed in the restore preview
+MAX_PREVIEW_LINES = 200
+
+# Where the tasks, history and app state are kept
+DATA_DIR = "data"
+
+# How often the Tk thread checks whether the tasks have finished loading
+STARTUP_POLL_MS = 20
+
+# Menu entries that need the tasks, disabled while they load
+DATA_MENUS = ("Home", "History", "File")
+
+# How often the Tk thread runs the callbacks other threads queued for it, e.g. error dialogs
+TK_QUEUE_POLL_MS = 100
 
 class TodoApp:
     def __init__(self, root):
@@ -17,59 +40,278 @@ class TodoApp:
         self.root.geometry("1100x800+100+100")
         self.root.minsize(1100, 800)
         
+        # Seconds from STARTED to the "first_frame" painted and to the task list being "ready"
+        self.startup_times = {}
+        
         # Create menu bar
         self.create_menu_bar()
         
-        # Initialize managers
+        # Other threads never call Tk themselves: a cross-thread call waits for the Tk thread, which
+        # hangs for good while that thread is waiting for them (e.g. flushing writes on exit)
+        self._tk_calls = deque()  # Callables to run on the Tk thread; deque appends are thread-safe
+        self._tk_poll_job = self.root.after(TK_QUEUE_POLL_MS, self.run_tk_calls)
+        
+        # Initialize managers; the database is opened by the loader thread below
         self.theme_manager = ThemeManager(root)
-        self.db_manager = DatabaseManager()
-        self.notification_manager = NotificationManager()
+        # The backup store also logs every change, so restores can pick any point in time
+        self.backup_store = BackupStore(
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), "backups", "store"))
+        self.db_manager = None
+        self.backup_scheduler = None
+        self.notification_manager = NotificationManager(
+            state_file=os.path.join(DATA_DIR, "reminders.state"))
         self.notification_manager.set_root(root)  # Set root window for notifications
-        
-        # Start notification service
         self.notification_manager.start_notification_service()
         
-        # Create main container
+        # With TODO_INSTRUMENT set, time the main loop from the start
+        if instruments.enabled:
+            instruments.watch_main_loop(self.root)
+            
+        # Write a report with the Tk thread's stack whenever the main loop freezes
+        self.watchdog = MainLoopWatchdog(self.root, os.path.join(DATA_DIR, "stalls"))
+        self.watchdog.start()
+        
+        # Flush pending writes when the window is closed
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+        # Create main container; each page is built once into a frame of its own and swapped in
         self.main_container = ttk.Frame(self.root)
         self.main_container.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        self.home_page = ttk.Frame(self.main_container)
+        self.home_page.pack(fill=tk.BOTH, expand=True)
+        self.history_frame = None
+        self.history_page = None  # Built the first time History is opened
         
-        # Create UI components
+        # Stage 1: the window shell with a progress bar, painted before a single task is read
         self.create_header()
+        self.create_loading_indicator()
+        self.set_data_menus_state("disabled")
+        self.root.bind("<Map>", self.on_first_map, add="+")
+        
+        # Stage 2: open the database and bring back the stored reminders off the Tk thread
+        self._loaded = None  # (DatabaseManager, exception) once the loader is done
+        self._loader = threading.Thread(target=self.load_data, daemon=True, name="startup-loader")
+        self._loader.start()
+        self.root.after(STARTUP_POLL_MS, self.poll_loader)
+        
+    def create_loading_indicator(self):
+        self.loading_frame = ttk.Frame(self.home_page)
+        self.loading_frame.pack(fill=tk.BOTH, expand=True)
+        ttk.Label(self.loading_frame, text="Loading tasks...").pack(pady=(200, 10))
+        # Animated by Tk itself, so it keeps moving while Python is busy loading
+        progress = ttk.Progressbar(self.loading_frame, mode="indeterminate", length=300)
+        progress.pack()
+        progress.start(15)
+        
+    def set_data_menus_state(self, state):
+        for label in DATA_MENUS:
+            self.menubar.entryconfigure(label, state=state)
+            
+    def on_first_map(self, event):
+        # Child widgets report their <Map> here too; only the window itself counts
+        if event.widget is self.root and "first_frame" not in self.startup_times:
+            self.root.after_idle(lambda: self.mark_startup("first_frame"))
+            
+    def mark_startup(self, stage):
+        seconds = time.perf_counter() - STARTED
+        self.startup_times[stage] = seconds
+        instruments.observe(f"startup.{stage}", seconds * 1000)
+        
+    def load_data(self):
+        # Runs on the loader thread and does not touch Tk; pandas is only imported from here on
+        try:
+            from database import DatabaseManager
+            db_manager = DatabaseManager(data_dir=DATA_DIR, on_error=self.report_error,
+                                         backup_store=self.backup_store)
+            self.notification_manager.rehydrate_reminders(db_manager)
+            self._loaded = (db_manager, None)
+        except Exception as e:
+            self._loaded = (None, e)
+            
+    def poll_loader(self):
+        if self._loaded is None:
+            self.root.after(STARTUP_POLL_MS, self.poll_loader)
+            return
+        db_manager, error = self._loaded
+        if error is not None:
+            messagebox.showerror("Error", f"Error loading tasks: {str(error)}")
+            self.on_close()
+            return
+        self.db_manager = db_manager
+        
+        # Back up in the background on the same scheduler thread as the reminders
+        self.backup_scheduler = BackupScheduler(self.db_manager, self.backup_store,
+                                                self.notification_manager.scheduler,
+                                                on_error=self.report_error)
+        self.backup_scheduler.start()
+        
+        # Stage 3: the rest of the home page, in place of the progress bar
+        self.loading_frame.destroy()
         self.create_task_input()
         self.create_task_list()
         self.create_filters()
         self.create_footer()
+        self.set_data_menus_state("normal")
+        self.mark_startup("ready")
+        
+    def call_on_tk(self, callback):
+        """Run callback on the Tk thread; safe to call from any thread"""
+        self._tk_calls.append(callback)
+        
+    def run_tk_calls(self):
+        while self._tk_calls:
+            self._tk_calls.popleft()()
+        self._tk_poll_job = self.root.after(TK_QUEUE_POLL_MS, self.run_tk_calls)
+        
+    def report_error(self, title, message):
+        # May be called from the persistence worker, so hand the dialog to the Tk thread
+        self.call_on_tk(lambda: messagebox.showerror(title, message))
+        
+    def on_close(self):
+        self.root.after_cancel(self._tk_poll_job)
+        instruments.stop_watching()
+        self.watchdog.stop()
+        if self.backup_scheduler is not None:
+            self.backup_scheduler.stop()
+        self.notification_manager.stop_notification_service()
+        # Closed while still loading: wait for the loader so its database is closed cleanly
+        self._loader.join()
+        db_manager = self.db_manager or self._loaded[0]
+        if db_manager is not None:
+            db_manager.close()
+        self.root.destroy()
         
     def create_menu_bar(self):
         menubar = tk.Menu(self.root)
         self.root.config(menu=menubar)
+        self.menubar = menubar
         
         # Add Home and History directly to menubar
         menubar.add_command(label="Home", command=self.show_home)
         menubar.add_command(label="History", command=self.show_history)
         
-    def show_home(self):
-        # Clear main container
-        for widget in self.main_container.winfo_children():
-            widget.destroy()
+        # Excel files are only an exchange format; tasks are stored in the snapshot
+        file_menu = tk.Menu(menubar, tearoff=0)
+        file_menu.add_command(label="Import from Excel...", command=self.import_excel)
+        file_menu.add_command(label="Export to Excel...", command=self.export_excel)
+        file_menu.add_separator()
+        file_menu.add_command(label="Restore Backup...", command=self.restore_backup)
+        menubar.add_cascade(label="File", menu=file_menu)
+        
+        # Instrumentation is off unless switched on here or with TODO_INSTRUMENT=1
+        diagnostics_menu = tk.Menu(menubar, tearoff=0)
+        self.instrument_var = tk.BooleanVar(value=instruments.enabled)
+        diagnostics_menu.add_checkbutton(label="Record Timings", variable=self.instrument_var,
+                                         command=self.toggle_instrumentation)
+        diagnostics_menu.add_command(label="Show Timings", command=self.show_timings)
+        diagnostics_menu.add_command(label="Save Trace...", command=self.save_trace)
+        diagnostics_menu.add_separator()
+        diagnostics_menu.add_command(label="Start Profiling", command=self.toggle_profiling)
+        self.diagnostics_menu = diagnostics_menu
+        menubar.add_cascade(label="Diagnostics", menu=diagnostics_menu)
+        
+    def toggle_instrumentation(self):
+        if self.instrument_var.get():
+            instruments.enable()
+            instruments.watch_main_loop(self.root)
+        else:
+            instruments.stop_watching()
+            instruments.disable()
             
-        # Recreate home page components
-        self.create_header()
-        self.create_task_input()
-        self.create_task_list()
-        self.create_filters()
-        self.create_footer()
+    def show_timings(self):
+        window = tk.Toplevel(self.root)
+        window.title("Timings")
+        window.geometry("760x500")
+        window.transient(self.root)
+        text = tk.Text(window, wrap="none", font=("Courier", 9))
+        text.pack(fill=tk.BOTH, expand=True)
+        lines = [instruments.report(), "", "Notifications:"]
+        lines += [f"{name:<28} {value:>8.6g}" for name, value in self.notification_manager.get_metrics().items()]
+        if self.startup_times:
+            lines += ["", "Startup:"] + [f"{stage:<28} {seconds * 1000:>8.0f} ms"
+                                         for stage, seconds in self.startup_times.items()]
+        if not instruments.enabled:
+            lines.insert(0, "Recording is off (Diagnostics > Record Timings).\n")
+        text.insert(tk.END, "\n".join(lines))
+        text.configure(state="disabled")
+        
+    def save_trace(self):
+        path = filedialog.asksaveasfilename(defaultextension=".json",
+                                            filetypes=[("Trace files", "*.json"), ("All files", "*.*")])
+        if not path:
+            return
+        try:
+            spans = instruments.write_trace(path)
+            messagebox.showinfo("Trace Saved", f"{spans} spans written to:\n{path}\n\n"
+                                "Open it in chrome://tracing, Perfetto or speedscope.")
+        except Exception as e:
+            messagebox.showerror("Trace Error", f"An error occurred while saving the trace:\n{str(e)}")
+            
+    def toggle_profiling(self):
+        # cProfile sees the thread it was started on; from the menu that is the Tk thread
+        if not instruments.profiling:
+            instruments.start_profile()
+            self.diagnostics_menu.entryconfigure("Start Profiling", label="Stop Profiling and Save...")
+            return
+        path = filedialog.asksaveasfilename(defaultextension=".prof",
+                                            filetypes=[("Profile files", "*.prof"), ("All files", "*.*")])
+        self.diagnostics_menu.entryconfigure("Stop Profiling and Save...", label="Start Profiling")
+        try:
+            instruments.stop_profile(path)
+            if path:
+                messagebox.showinfo("Profile Saved", f"Profile written to:\n{path}\n\n"
+                                    "Open it with pstats, snakeviz or flameprof.")
+        except Exception as e:
+            messagebox.showerror("Profile Error", f"An error occurred while saving the profile:\n{str(e)}")
         
+    def import_excel(self):
+        path = filedialog.askopenfilename(filetypes=[("Excel files", "*.xlsx"), ("All files", "*.*")])
+        if not path:
+            return
+        if not messagebox.askyesno("Confirm Import", "This will replace all current tasks. Continue?"):
+            return
+        try:
+            self.db_manager.import_tasks(path)
+            self.refresh_task_list()
+        except Exception as e:
+            messagebox.showerror("Import Error", f"An error occurred while importing:\n{str(e)}")
+            
+    def export_excel(self):
+        path = filedialog.asksaveasfilename(defaultextension=".xlsx",
+                                            filetypes=[("Excel files", "*.xlsx"), ("All files", "*.*")])
+        if not path:
+            return
+        try:
+            self.db_manager.export_tasks(path)
+            messagebox.showinfo("Export Successful", f"Tasks have been exported to:\n{path}")
+        except Exception as e:
+            messagebox.showerror("Export Error", f"An error occurred while exporting:\n{str(e)}")
+        
+    @timed("app.show_home")
+    def show_home(self):
+        # The task list is kept up to date while hidden, so there is nothing to reload
+        self.show_page(self.home_page)
+        
+    @timed("app.show_history")
     def show_history(self):
-        # Clear main container
+        if self.history_page is None:
+            from history import HistoryPage
+            self.history_frame = ttk.Frame(self.main_container)
+            self.history_page = HistoryPage(self.history_frame, self.db_manager)
+        else:
+            # Only reread the history if something was changed since it was last shown
+            self.history_page.sync()
+        self.show_page(self.history_frame)
+        
+    def show_page(self, page):
         for widget in self.main_container.winfo_children():
-            widget.destroy()
-            
-        # Create history page
-        self.history_page = HistoryPage(self.main_container, self.db_manager)
+            if widget is not page:
+                widget.pack_forget()
+        if not page.winfo_manager():
+            page.pack(fill=tk.BOTH, expand=True)
         
     def create_header(self):
-        header_frame = ttk.Frame(self.main_container)
+        header_frame = ttk.Frame(self.home_page)
         header_frame.pack(fill=tk.X, pady=(0, 10))
         
         # Add image
@@ -103,7 +345,7 @@ class TodoApp:
         theme_button.pack(side=tk.RIGHT, padx=(5, 0))
 
     def create_footer(self):
-        footer_frame = ttk.Frame(self.main_container)
+        footer_frame = ttk.Frame(self.home_page)
         footer_frame.pack(fill=tk.X, pady=(10, 0))
         
         copyright_label = ttk.Label(footer_frame, text="© 2025 Developed by Md Sabbir Ahmad", 
@@ -111,70 +353,133 @@ class TodoApp:
         copyright_label.pack(side=tk.BOTTOM, pady=5)
         
     def backup_data(self):
-        try:
-            # Create backups directory if it doesn't exist
-            backup_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backups")
-            os.makedirs(backup_dir, exist_ok=True)
-            
-            # Get the current date and time for the backup filename
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        if self.backup_scheduler is None:
+            return  # The header is shown before the tasks have loaded
+        # The backup runs on the backup worker; its outcome is queued for the Tk thread
+        self.backup_scheduler.backup_now(
+            lambda manifest, removed, error: self.call_on_tk(
+                lambda: self.show_backup_result(manifest, removed, error)))
             
-            # Backup tasks.xlsx
-            tasks_backup_filename = f"tasks_backup_{timestamp}.xlsx"
-            tasks_backup_path = os.path.join(backup_dir, tasks_backup_filename)
-            shutil.copy2(self.db_manager.excel_file, tasks_backup_path)
-            
-            # Backup history.xlsx
-            history_backup_filename = f"history_backup_{timestamp}.xlsx"
-            history_backup_path = os.path.join(backup_dir, history_backup_filename)
-            shutil.copy2(self.db_manager.history_file, history_backup_path)
-            
-            messagebox.showinfo("Backup Successful", 
-                              f"Data has been backed up successfully to:\n{tasks_backup_path}\n{history_backup_path}")
-            
-        except Exception as e:
+    def show_backup_result(self, manifest, removed, error):
+        if error is not None:
             messagebox.showerror("Backup Error", 
-                               f"An error occurred while creating the backup:\n{str(e)}")
+                               f"An error occurred while creating the backup:\n{str(error)}")
+            return
+        # Only the chunks that changed since an earlier backup were written
+        if manifest is None:
+            messagebox.showinfo("Backup", "Nothing has changed since the last backup.")
+            return
+        message = (f"Backup of {manifest['task_count']} tasks and {manifest['history_count']} history rows "
+                   f"saved ({manifest['bytes_written'] / 1024:.1f} KB written).")
+        if removed:
+            message += f"\n{len(removed)} older backup(s) removed by the retention policy."
+        messagebox.showinfo("Backup Successful", message)
             
     def restore_backup(self):
-        try:
-            # Set the default backup directory
-            backup_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backups")
+        backups = self.backup_store.list()
+        if not backups:
+            messagebox.showinfo("Restore", "There are no backups to restore yet.")
+            return
             
-            # Ask user to select a backup file from the backups directory
-            backup_path = filedialog.askopenfilename(
-                initialdir=backup_dir,
-                filetypes=[("Excel files", "*.xlsx"), ("All files", "*.*")]
-            )
+        # Restore to any moment: the latest backup before it plus the changes logged since.
+        # Older .xlsx backups go through File > Import from Excel
+        restore_window = tk.Toplevel(self.root)
+        restore_window.title("Restore Backup")
+        restore_window.geometry("600x550")
+        restore_window.transient(self.root)
             
-            if backup_path:  # If user didn't cancel
-                # Confirm restoration
-                if messagebox.askyesno("Confirm Restore", 
-                                     "This will replace all current data with the backup data. Continue?"):
-                    # Determine if this is a tasks or history backup
-                    if "tasks_backup" in backup_path:
-                        target_file = self.db_manager.excel_file
-                    elif "history_backup" in backup_path:
-                        target_file = self.db_manager.history_file
-                    else:
-                        messagebox.showerror("Error", "Invalid backup file format!")
-                        return
-                    
-                    # Copy the backup file to the current database location
-                    shutil.copy2(backup_path, target_file)
-                    
-                    # Reload the data
-                    self.reload_tasks()
+        main_frame = ttk.Frame(restore_window, padding="20")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+                        
+        time_frame = ttk.Frame(main_frame)
+        time_frame.pack(fill=tk.X, pady=(0, 10))
+        ttk.Label(time_frame, text="Restore to (YYYY-MM-DD HH:MM:SS):").pack(side=tk.LEFT)
+        time_entry = ttk.Entry(time_frame, width=20)
+        time_entry.insert(0, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        time_entry.pack(side=tk.LEFT, padx=5)
+        
+        ttk.Label(main_frame, text="Backups (pick one to restore to the moment it was taken):").pack(anchor="w")
+        backup_list = tk.Listbox(main_frame, height=6)
+        backup_list.pack(fill=tk.X, pady=(0, 10))
+        for manifest in backups:
+            backup_list.insert(tk.END, f"{manifest['created'].replace('T', ' ')}  -  "
+                                       f"{manifest['task_count']} tasks, {manifest['history_count']} history rows")
+                                       
+        def pick_backup(event):
+            selected = backup_list.curselection()
+            if selected:
+                manifest = backups[selected[0]]
+                as_of = datetime.fromisoformat(manifest.get("as_of", manifest["created"]))
+                # Round up to the second shown, so the backup itself is the starting point
+                if as_of.microsecond:
+                    as_of += timedelta(microseconds=1000000 - as_of.microsecond)
+                time_entry.delete(0, tk.END)
+                time_entry.insert(0, as_of.strftime("%Y-%m-%d %H:%M:%S"))
+                restore_button.configure(state="disabled")
+                
+        backup_list.bind("<<ListboxSelect>>", pick_backup)
+        
+        ttk.Label(main_frame, text="Changes to the current tasks:").pack(anchor="w")
+        preview_text = tk.Text(main_frame, height=12, wrap="none", state="disabled")
+        preview_text.pack(fill=tk.BOTH, expand=True)
+        
+        # (tasks, history) of the last preview; Restore applies exactly what was previewed
+        previewed = {}
+        
+        def preview():
+            try:
+                when = datetime.strptime(time_entry.get().strip(), "%Y-%m-%d %H:%M:%S")
+                tasks, history_tasks, (added, removed, changed) = self.db_manager.preview_restore(
+                    self.backup_store, when)
+            except Exception as e:
+                messagebox.showerror("Restore Error", f"Could not rebuild that point in time:\n{str(e)}",
+                                   parent=restore_window)
+                return
+            previewed["state"] = (tasks, history_tasks)
+            lines = [f"{len(tasks)} tasks and {len(history_tasks)} history rows as of {when}",
+                     f"{len(added)} added, {len(removed)} removed, {len(changed)} changed", ""]
+            lines += [f"+ {task['Title']}" for task in added[:MAX_PREVIEW_LINES]]
+            lines += [f"- {task['Title']}" for task in removed[:MAX_PREVIEW_LINES]]
+            for old, new in changed[:MAX_PREVIEW_LINES]:
+                fields = [field for field in new if old.get(field) != new.get(field)]
+                lines.append(f"~ {new['Title']}: " + ", ".join(
+                    f"{field} {old.get(field, '')!s} -> {new.get(field, '')!s}" for field in fields))
+            preview_text.configure(state="normal")
+            preview_text.delete("1.0", tk.END)
+            preview_text.insert(tk.END, "\n".join(lines))
+            preview_text.configure(state="disabled")
+            restore_button.configure(state="normal")
                     
-                    messagebox.showinfo("Restore Successful", 
-                                      "Data has been restored successfully from the backup.")
+        def restore():
+            if "state" not in previewed:
+                return
+            if not messagebox.askyesno("Confirm Restore", 
+                                     "This will replace all current data with the previewed data. Continue?",
+                                     parent=restore_window):
+                return
+            try:
+                self.db_manager.restore_state(*previewed["state"])
+                restore_window.destroy()
+                self.refresh_task_list()
+                messagebox.showinfo("Restore Successful", 
+                                  "Data has been restored successfully from the backup.")
+            except Exception as e:
+                messagebox.showerror("Restore Error", 
+                                   f"An error occurred while restoring the backup:\n{str(e)}")
                     
-        except Exception as e:
-            messagebox.showerror("Restore Error", 
-                               f"An error occurred while restoring the backup:\n{str(e)}")
+        button_frame = ttk.Frame(main_frame)
+        button_frame.pack(pady=(10, 0))
+        ttk.Button(button_frame, text="Preview", command=preview).pack(side=tk.LEFT, padx=5)
+        restore_button = ttk.Button(button_frame, text="Restore", command=restore, state="disabled")
+        restore_button.pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Cancel", command=restore_window.destroy).pack(side=tk.LEFT, padx=5)
+        
+        # Editing the time invalidates the preview
+        time_entry.bind("<Key>", lambda event: restore_button.configure(state="disabled"))
             
     def create_task_input(self):
-        input_frame = ttk.LabelFrame(self.main_container, text="Add New Task")
+        from tkcalendar import DateEntry  # Slow to import; not needed for the first frame
+        input_frame = ttk.LabelFrame(self.home_page, text="Add New Task")
         input_frame.pack(fill=tk.X, pady=(0, 10))
         
         # Create a frame for the input fields with 3 columns
@@ -263,7 +568,7 @@ class TodoApp:
         
     def create_task_list(self):
         """Create the task list section"""
-        list_frame = ttk.LabelFrame(self.main_container, text="Tasks")
+        list_frame = ttk.LabelFrame(self.home_page, text="Tasks")
         list_frame.pack(fill=tk.BOTH, expand=True)
         
         # Create Treeview with custom style
@@ -278,22 +583,22 @@ class TodoApp:
                  background=[('active', '#1F7CC3')],
                  foreground=[('active', 'white')])
         
-        # Create Treeview
-        columns = ("Title", "Description", "Date", "Reminder Time", "Priority", "Category", "Status")
-        self.task_tree = ttk.Treeview(list_frame, columns=columns, show="headings", style="Custom.Treeview")
+        # Create Treeview; only the rows in view are materialized as items
+        columns = TASK_COLUMNS
+        self.task_view = VirtualTreeview(list_frame, columns, task_values,
+                                         tags_for=self.task_tags, key_for=lambda task: task["ID"],
+                                         style="Custom.Treeview")
+        self.task_tree = self.task_view.tree
         
-        # Set column headings
+        # Set column headings; clicking a heading sorts by that column
+        self.sort_keys = []  # (field, ascending) pairs, most significant first
         for col in columns:
-            self.task_tree.heading(col, text=col, anchor="w")
+            self.task_tree.heading(col, text=col, anchor="w", command=lambda c=col: self.sort_by(c))
             self.task_tree.column(col, width=150, anchor="w") 
         
-        # Add scrollbar
-        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.task_tree.yview)
-        self.task_tree.configure(yscrollcommand=scrollbar.set)
-        
-        # Pack widgets
+        # Pack widgets (the view drives its own scrollbar)
         self.task_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.task_view.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
         # Add context menu
         self.create_context_menu()
@@ -303,13 +608,15 @@ class TodoApp:
         
     def create_filters(self):
         """Create the filter section"""
-        filter_frame = ttk.LabelFrame(self.main_container, text="Filters")
+        filter_frame = ttk.LabelFrame(self.home_page, text="Filters")
         filter_frame.pack(fill=tk.X, pady=(10, 0))
         
         # Search
         ttk.Label(filter_frame, text="Search:").pack(side=tk.LEFT, padx=5)
         self.search_var = tk.StringVar()
-        self.search_var.trace("w", self.apply_filters)
+        # Typing is debounced; queries run off the Tk thread and only the newest result is shown
+        self.search_pipeline = SearchPipeline(self.root, self.run_search, self.task_view.set_rows)
+        self.search_var.trace("w", lambda *args: self.apply_filters(debounce=True))
         search_entry = ttk.Entry(filter_frame, textvariable=self.search_var)
         search_entry.pack(side=tk.LEFT, padx=5)
         
@@ -416,8 +723,9 @@ class TodoApp:
         if not selected:
             return
             
-        task_idx = self.task_tree.index(selected[0])
-        task = self.db_manager.tasks[task_idx]
+        # Edit a copy so the stored task only changes when the edit is saved
+        task_id = self.task_view.row(selected[0])["ID"]
+        task = dict(self.db_manager.get_task(task_id))
         
         # Create edit window
         edit_window = tk.Toplevel(self.root)
@@ -525,7 +833,7 @@ class TodoApp:
                     messagebox.showwarning("Warning", "Invalid reminder date/time format! Use YYYY-MM-DD HH:MM")
                     return
             
-            self.db_manager.update_task(task_idx, task)
+            self.db_manager.update_task(task_id, task)
             self.refresh_task_list()
             edit_window.destroy()
             
@@ -553,8 +861,9 @@ class TodoApp:
             return
             
         if messagebox.askyesno("Confirm Delete", "Are you sure you want to delete this task?"):
-            task_idx = self.task_tree.index(selected[0])
-            self.db_manager.delete_task(task_idx)
+            task_id = self.task_view.row(selected[0])["ID"]
+            self.db_manager.delete_task(task_id)
+            self.notification_manager.cancel_reminder(task_id)
             self.refresh_task_list()
             
     def toggle_task_status(self):
@@ -562,10 +871,10 @@ class TodoApp:
         if not selected:
             return
             
-        task_idx = self.task_tree.index(selected[0])
-        task = self.db_manager.tasks[task_idx]
+        task_id = self.task_view.row(selected[0])["ID"]
+        task = dict(self.db_manager.get_task(task_id))
         task["Status"] = "Completed" if task["Status"] == "Pending" else "Pending"
-        self.db_manager.update_task(task_idx, task)
+        self.db_manager.update_task(task_id, task)
         self.refresh_task_list()
         
     def clear_inputs(self):
@@ -582,59 +891,56 @@ class TodoApp:
         self.reminder_time.delete(0, tk.END)
         self.reminder_time.insert(0, current_time.strftime("%H:%M"))
         
+    def task_tags(self, task):
+        # Apply priority color
+        if task['Priority'] in self.theme_manager.priority_colors:
+            return (task['Priority'],)
+        return ()
+        
+    @timed("app.refresh_task_list")
     def refresh_task_list(self):
-        for item in self.task_tree.get_children():
-            self.task_tree.delete(item)
-            
-        for task in self.db_manager.tasks:
-            values = (
-                task["Title"],
-                task["Description"],
-                task["Due Date"],
-                task.get("Reminder Time", ""),  # Get reminder time with default empty string
-                task["Priority"],
-                task["Category"],
-                task["Status"]
-            )
+        if self.sort_keys:
+            self.task_view.set_rows(self.db_manager.filter_tasks(sort=self.sort_keys))
+        else:
+            self.task_view.set_rows(self.db_manager.tasks)
             
-            item = self.task_tree.insert("", tk.END, values=values)
+    def sort_by(self, column):
+        field = "Due Date" if column == "Date" else column
+        if self.sort_keys and self.sort_keys[0][0] == field:
+            # Clicking the sorted column again flips its direction
+            self.sort_keys[0] = (field, not self.sort_keys[0][1])
+        else:
+            # Earlier sort columns break ties, most recent first
+            self.sort_keys = [(field, True)] + [key for key in self.sort_keys if key[0] != field][:2]
             
-            # Apply priority color
-            if task['Priority'] in self.theme_manager.priority_colors:
-                self.task_tree.item(item, tags=(task['Priority'],))
+        # Mark the primary sort column in its heading
+        for col in TASK_COLUMNS:
+            text = col
+            if col == column:
+                text += " ▲" if self.sort_keys[0][1] else " ▼"
+            self.task_tree.heading(col, text=text)
+        self.apply_filters()
                 
-    def apply_filters(self, *args):
-        search_text = self.search_var.get()
-        priority_filter = self.priority_filter.get()
-        category_filter = self.category_filter.get()
-        
-        filtered_tasks = self.db_manager.filter_tasks(search_text, priority_filter, category_filter)
-        
-        for item in self.task_tree.get_children():
-            self.task_tree.delete(item)
-            
-        for task in filtered_tasks:
-            values = (
-                task["Title"],
-                task["Description"],
-                task["Due Date"],
-                task.get("Reminder Time", ""),  # Get reminder time with default empty string
-                task["Priority"],
-                task["Category"],
-                task["Status"]
-            )
-            
-            item = self.task_tree.insert("", tk.END, values=values)
-            
-            # Apply priority color
-            if task['Priority'] in self.theme_manager.priority_colors:
-                self.task_tree.item(item, tags=(task['Priority'],))
+    @timed("app.apply_filters")
+    def apply_filters(self, *args, debounce=False):
+        params = {
+            "search_text": self.search_var.get(),
+            "priority": self.priority_filter.get(),
+            "category": self.category_filter.get(),
+            "sort": tuple(self.sort_keys)
+        }
+        self.search_pipeline.submit(params, None if debounce else 0)
+        
+    @timed("app.run_search")
+    def run_search(self, params, previous):
+        # Runs on the search worker; a query that narrows the one on screen only rechecks its rows
+        if previous is not None and narrows(previous[0], params):
+            refined = self.db_manager.refine_tasks(previous[1], params["search_text"])
+            if refined is not None:
+                return refined
+        return self.db_manager.filter_tasks(**params)
 
     def reload_tasks(self):
-        # Clear current display
-        for item in self.task_tree.get_children():
-            self.task_tree.delete(item)
-            
         # Reload tasks from database
         self.db_manager.load_tasks()
         
@@ -647,8 +953,11 @@ class TodoApp:
     def __del__(self):
         if hasattr(self, 'notification_manager'):
             self.notification_manager.stop_notification_service()
+        if getattr(self, 'db_manager', None) is not None:
+            self.db_manager.close()
 
 if __name__ == "__main__":
+    from ttkthemes import ThemedTk
     root = ThemedTk(theme="clam")
     # Set application icon
     root.iconbitmap("icon/icon.ico")
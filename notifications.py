@@ -1,45 +1,287 @@
-import schedule
+from collections import deque
+import heapq
+import itertools
 import time
 import threading
 from datetime import datetime, timedelta
+import calendar
 import os
+import numpy as np
 import tkinter as tk
 from tkinter import messagebox
+from instrumentation import span, count
 
-class NotificationManager:
+# Format of the Reminder Time column
+REMINDER_FORMAT = '%Y-%m-%d %H:%M'
+
+# Most task titles listed in the missed-reminders notice
+MAX_OVERDUE_LISTED = 10
+
+# How often the Tk thread drains the delivery queue; reminders arriving
+# within one interval are shown together
+DELIVERY_INTERVAL_MS = 500
+
+# How long a toast stays on screen, and how many can be stacked at once
+TOAST_DURATION_MS = 10000
+MAX_TOASTS = 4
+
+# Longest the scheduler sleeps in one go, so wall-clock changes and suspend/resume are noticed
+MAX_SLEEP = 60
+
+def next_occurrence(when, recurrence_interval):
+    """Next fire time of a recurring reminder, or None for one-time reminders"""
+    interval = (recurrence_interval or "").lower()
+    if interval == "daily":
+        return when + timedelta(days=1)
+    if interval == "weekly":
+        return when + timedelta(weeks=1)
+    if interval == "monthly":
+        # Same day next month, clamped to the month's length
+        year, month = (when.year + 1, 1) if when.month == 12 else (when.year, when.month + 1)
+        day = min(when.day, calendar.monthrange(year, month)[1])
+        return when.replace(year=year, month=month, day=day)
+    return None
+
+class ReminderScheduler:
+    """One thread firing reminders from a min-heap of (fire_time, seq, reminder_id).
+
+    The thread sleeps until the earliest entry is due instead of polling.
+    Cancelling marks the entry dead and leaves it in the heap until it
+    surfaces; rescheduling pushes a new entry. Both are O(log n) at most,
+    and the thread count stays at one however many reminders are pending.
+    """
     def __init__(self):
+        self._heap = []
+        self._entries = {}  # reminder_id -> live heap entry
+        self._counter = itertools.count()  # Tie-breaker so equal times never compare ids
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def __len__(self):
+        with self._cond:
+            return len(self._entries)
+
+    def schedule(self, reminder_id, fire_time, callback, recurrence_interval=None):
+        """Schedule or reschedule a reminder; fire_time is a datetime"""
+        with self._cond:
+            self._discard(reminder_id)
+            entry = [fire_time.timestamp(), next(self._counter), reminder_id,
+                     fire_time, callback, recurrence_interval]
+            self._entries[reminder_id] = entry
+            heapq.heappush(self._heap, entry)
+            # Wake the thread only if the new entry is now the earliest
+            if self._heap[0] is entry:
+                self._cond.notify()
+
+    def schedule_many(self, reminders):
+        """Bulk insert of (reminder_id, fire_time, callback, recurrence_interval) tuples"""
+        with self._cond:
+            for reminder_id, fire_time, callback, recurrence_interval in reminders:
+                self._discard(reminder_id)
+                entry = [fire_time.timestamp(), next(self._counter), reminder_id,
+                         fire_time, callback, recurrence_interval]
+                self._entries[reminder_id] = entry
+                self._heap.append(entry)
+            heapq.heapify(self._heap)
+            self._cond.notify()
+
+    def cancel(self, reminder_id):
+        with self._cond:
+            return self._discard(reminder_id)
+
+    def clear(self):
+        with self._cond:
+            self._heap.clear()
+            self._entries.clear()
+
+    def _discard(self, reminder_id):
+        entry = self._entries.pop(reminder_id, None)
+        if entry is None:
+            return False
+        entry[2] = None  # Dead entries are skipped when they reach the top of the heap
+        # Rebuild once dead entries dominate so the heap does not grow without bound
+        if len(self._heap) > 64 and len(self._heap) > 2 * len(self._entries):
+            self._heap = [e for e in self._heap if e[2] is not None]
+            heapq.heapify(self._heap)
+        return True
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True, name="reminder-scheduler")
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running:
+                    while self._heap and self._heap[0][2] is None:
+                        heapq.heappop(self._heap)
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    delay = self._heap[0][0] - time.time()
+                    if delay <= 0:
+                        break
+                    self._cond.wait(min(delay, MAX_SLEEP))
+                if not self._running:
+                    return
+                entry = heapq.heappop(self._heap)
+                _, _, reminder_id, fire_time, callback, recurrence_interval = entry
+                del self._entries[reminder_id]
+
+            try:
+                with span("reminders.fire"):
+                    callback()
+                count("reminders.fired")
+            except Exception as e:
+                print(f"Error firing reminder: {e}")
+
+            following = next_occurrence(fire_time, recurrence_interval)
+            if following is not None:
+                with self._cond:
+                    # Skip if the reminder was rescheduled while its callback ran
+                    if reminder_id not in self._entries:
+                        self.schedule(reminder_id, following, callback, recurrence_interval)
+
+def reminder_key(task):
+    """Scheduler key of a task's reminder; the title is the fallback for tasks without an ID"""
+    return task.get('ID') or task['Title']
+
+class NotificationManager:
+    def __init__(self, state_file=None):
+        self.state_file = state_file  # Remembers when the app last ran, to find missed reminders
         self.notification_thread = None
         self.is_running = False
-        self.scheduled_tasks = {}  # Store scheduled tasks
+        self.scheduler = ReminderScheduler()  # Pending reminders, keyed by task ID
         self.root = None  # Will be set when needed
+        self._queue = deque()  # (title, message) waiting for the Tk thread; deque appends are thread-safe
+        self._toasts = []  # Toast windows on screen, oldest first
+        self._drain_job = None
+        self.metrics = {
+            'queued': 0,  # Notifications handed to show_notification
+            'delivered': 0,  # Notifications that reached the screen
+            'toasts': 0,  # Toast windows opened; lower than delivered when coalescing kicks in
+            'coalesced': 0,  # Notifications folded into a summary toast
+            'max_queue_depth': 0,
+        }
+        self._started_at = time.monotonic()
         # Get the path to the icon file
         self.icon_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "icon", "icon.ico")
 
     def set_root(self, root):
         self.root = root
+        if self._drain_job is None:
+            self._drain_job = root.after(DELIVERY_INTERVAL_MS, self._drain)
 
     def show_notification(self, title, message):
+        """Queue a notification; safe to call from any thread and never blocks.
+
+        With a root window the queue is drained on the Tk thread into
+        non-modal toasts. Without one, fall back to a modal message box.
+        """
         try:
             #print(f"Attempting to show notification: {title}")
             if self.root:
-                # Create messagebox and auto-close after 10 seconds
-                msg_box = messagebox.showinfo(title, message)
-                self.root.after(10000, lambda: self.root.focus_force())
+                self._queue.append((title, message))
+                self.metrics['queued'] += 1
+                self.metrics['max_queue_depth'] = max(self.metrics['max_queue_depth'], len(self._queue))
             else:
                 # If no root window, create a temporary one
-                temp_root = tk.Tk()
-                temp_root.withdraw()  # Hide the temporary window
-                msg_box = messagebox.showinfo(title, message)
-                temp_root.after(10000, temp_root.destroy)  # Destroy after 10 seconds
+                with span("notifications.modal"):
+                    temp_root = tk.Tk()
+                    temp_root.withdraw()  # Hide the temporary window
+                    msg_box = messagebox.showinfo(title, message)
+                    temp_root.after(10000, temp_root.destroy)  # Destroy after 10 seconds
             #print(f"Notification shown successfully: {title}")  # Debug print
             return True
         except Exception as e:
             print(f"Error showing notification: {e}")
             return False
 
-    def schedule_reminder(self, task, reminder_time, is_recurring=False, recurrence_interval=None):
+    def get_metrics(self):
+        """Delivery counters plus the current queue depth and throughput"""
+        metrics = dict(self.metrics)
+        metrics['queue_depth'] = len(self._queue)
+        elapsed = time.monotonic() - self._started_at
+        metrics['delivered_per_minute'] = metrics['delivered'] * 60 / elapsed if elapsed else 0.0
+        return metrics
+
+    def _drain(self):
+        # Runs on the Tk thread; everything queued since the last pass becomes one toast
+        self._drain_job = None
+        batch = []
+        while self._queue:
+            batch.append(self._queue.popleft())
+        try:
+            if len(batch) == 1:
+                with span("notifications.toast"):
+                    self._show_toast(*batch[0])
+            elif batch:
+                # Keep the first line of each notification, e.g. "Task: ..."
+                lines = [message.split("\n", 1)[0] for _, message in batch]
+                if len(lines) > MAX_OVERDUE_LISTED:
+                    lines = lines[:MAX_OVERDUE_LISTED] + [f"...and {len(lines) - MAX_OVERDUE_LISTED} more"]
+                with span("notifications.toast"):
+                    self._show_toast(f"{len(batch)} Reminders", "\n".join(lines))
+                self.metrics['coalesced'] += len(batch)
+            self.metrics['delivered'] += len(batch)
+        except Exception as e:
+            print(f"Error showing notification: {e}")
+        if self.root:
+            self._drain_job = self.root.after(DELIVERY_INTERVAL_MS, self._drain)
+
+    def _show_toast(self, title, message):
+        # Drop the oldest toast if the stack is full
+        while len(self._toasts) >= MAX_TOASTS:
+            self._close_toast(self._toasts[0])
+
+        toast = tk.Toplevel(self.root)
+        toast.overrideredirect(True)  # No title bar, and it does not take focus
+        toast.attributes('-topmost', True)
+        frame = tk.Frame(toast, bd=1, relief=tk.SOLID, padx=12, pady=8, bg="#ffffe0")
+        frame.pack(fill=tk.BOTH, expand=True)
+        tk.Label(frame, text=title, font=("Helvetica", 10, "bold"), bg="#ffffe0",
+                 anchor="w").pack(fill=tk.X)
+        tk.Label(frame, text=message, justify=tk.LEFT, bg="#ffffe0", anchor="w",
+                 wraplength=320).pack(fill=tk.X)
+        # Click anywhere on the toast to dismiss it
+        for widget in (toast, frame, *frame.winfo_children()):
+            widget.bind("<Button-1>", lambda e: self._close_toast(toast))
+
+        self._toasts.append(toast)
+        self.metrics['toasts'] += 1
+        self._place_toasts()
+        toast.after(TOAST_DURATION_MS, lambda: self._close_toast(toast))
+
+    def _close_toast(self, toast):
+        if toast in self._toasts:
+            self._toasts.remove(toast)
+            toast.destroy()
+            self._place_toasts()
+
+    def _place_toasts(self):
+        # Stack upwards from the bottom-right corner of the screen, newest at the bottom
+        bottom = self.root.winfo_screenheight() - 60
+        for toast in reversed(self._toasts):
+            toast.update_idletasks()
+            width, height = toast.winfo_reqwidth(), toast.winfo_reqheight()
+            bottom -= height + 8
+            toast.geometry(f"+{self.root.winfo_screenwidth() - width - 20}+{bottom}")
+
+    def _reminder_job(self, task):
         def reminder_job():
-            #print(f"Reminder job triggered for task: {task['Title']}")  # Debug print
             # Create a more detailed message
             message = (
                 f"Task: {task['Title']}\n"
@@ -54,68 +296,106 @@ class NotificationManager:
                 f"Task Reminder",
                 message
             )
+        return reminder_job
 
+    def schedule_reminder(self, task, reminder_time, is_recurring=False, recurrence_interval=None):
+        reminder_job = self._reminder_job(task)
         try:
-            # Parse the reminder time
-            #print(f"Current time: {datetime.now().strftime('%Y-%m-%d %H:%M')}")  # Debug print
-            #print(f"Setting reminder for: {reminder_time}")  # Debug print
-            
             # Parse the reminder datetime
-            reminder_datetime = datetime.strptime(reminder_time, '%Y-%m-%d %H:%M')
-            current_time = datetime.now()
-            
-            # Calculate time until reminder
-            time_until_reminder = (reminder_datetime - current_time).total_seconds()
-            #print(f"Time until reminder: {time_until_reminder} seconds")  # Debug print
-            #print(f"Reminder will trigger at: {reminder_datetime.strftime('%Y-%m-%d %H:%M')}")  # Debug print
+            reminder_datetime = datetime.strptime(reminder_time, REMINDER_FORMAT)
             
-            if time_until_reminder < 0:
+            if reminder_datetime < datetime.now():
                 print(f"Reminder time {reminder_time} has already passed")
                 return
             
-            # Schedule the reminder
+            # Tasks with the same title no longer overwrite each other's reminders
+            reminder_id = reminder_key(task)
+            self.scheduler.schedule(reminder_id, reminder_datetime, reminder_job,
+                                    recurrence_interval if is_recurring else None)
             if is_recurring and recurrence_interval:
-                if recurrence_interval == 'Daily':
-                    schedule.every().day.at(reminder_datetime.strftime('%H:%M')).do(reminder_job)
-                elif recurrence_interval == 'Weekly':
-                    schedule.every().monday.at(reminder_datetime.strftime('%H:%M')).do(reminder_job)
-                elif recurrence_interval == 'Monthly':
-                    schedule.every().day.at(reminder_datetime.strftime('%H:%M')).do(reminder_job)
                 print(f"Set up recurring reminder: {recurrence_interval} at {reminder_datetime.strftime('%H:%M')}")
-            else:
-                # For one-time reminders, use threading.Timer
-                #print(f"Setting up one-time reminder for {reminder_datetime.strftime('%Y-%m-%d %H:%M')}")  # Debug print
-                timer = threading.Timer(time_until_reminder, reminder_job)
-                timer.start()
-                self.scheduled_tasks[task['Title']] = timer
-                #print(f"Scheduled one-time reminder for {reminder_datetime.strftime('%Y-%m-%d %H:%M')}")
                 
         except Exception as e:
             print(f"Error scheduling reminder: {e}")
 
+    def rehydrate_reminders(self, db_manager):
+        """Reschedule the stored reminders of db_manager's tasks after a restart.
+
+        The reminder times of the unfinished tasks are read straight from the
+        task table's date column, so no row is built for tasks without one.
+        Future reminders go into the scheduler in one bulk insert; the ones
+        that came due while the app was closed are shown as a single notice.
+        Returns (scheduled, overdue) counts.
+        """
+        last_run = self._read_last_run()
+        now = datetime.now()
+        self._write_last_run(now)
+        task_ids, when = db_manager.reminders()
+        if not len(task_ids):
+            return 0, 0
+
+        upcoming = when >= np.datetime64(now)
+        missed = ~upcoming
+        if last_run is not None:
+            missed &= when >= np.datetime64(last_run)
+
+        # Only the tasks with a future reminder get a row view and a job
+        fire_times = when[upcoming].astype('datetime64[us]').tolist()
+        tasks = [db_manager.get_task(task_id) for task_id in task_ids[upcoming]]
+        self.scheduler.schedule_many(
+            (reminder_key(task), fire_time, self._reminder_job(task), None)
+            for task, fire_time in zip(tasks, fire_times)
+        )
+
+        overdue = [db_manager.get_task(task_id) for task_id in task_ids[missed]]
+        if overdue:
+            self._notify_overdue(overdue)
+        return len(tasks), len(overdue)
+
+    def _notify_overdue(self, overdue):
+        overdue = sorted(overdue, key=lambda task: task['Reminder Time'])
+        lines = [f"{task['Reminder Time']}  {task['Title']}" for task in overdue[:MAX_OVERDUE_LISTED]]
+        if len(overdue) > MAX_OVERDUE_LISTED:
+            lines.append(f"...and {len(overdue) - MAX_OVERDUE_LISTED} more")
+        title = f"{len(overdue)} Missed Reminder{'s' if len(overdue) > 1 else ''}"
+        self.show_notification(title, "\n".join(lines))
+
+    def _read_last_run(self):
+        if not self.state_file or not os.path.exists(self.state_file):
+            return None
+        try:
+            with open(self.state_file, encoding='utf-8') as f:
+                return datetime.fromisoformat(f.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    def _write_last_run(self, when):
+        if not self.state_file:
+            return
+        try:
+            with open(self.state_file, 'w', encoding='utf-8') as f:
+                f.write(when.isoformat(timespec='seconds'))
+        except OSError as e:
+            print(f"Error saving reminder state: {e}")
+
+    def cancel_reminder(self, reminder_id):
+        return self.scheduler.cancel(reminder_id)
+
     def start_notification_service(self):
-        def run_scheduler():
-            self.is_running = True
-            #print("Notification service started")  # Debug print
-            while self.is_running:
-                try:
-                    schedule.run_pending()
-                    time.sleep(1)
-                except Exception as e:
-                    print(f"Error in notification service: {e}")
-                    time.sleep(1)
-
-        self.notification_thread = threading.Thread(target=run_scheduler)
-        self.notification_thread.daemon = True
-        self.notification_thread.start()
-        #print("Notification thread started")  # Debug print
+        self.is_running = True
+        self.scheduler.start()
+        self.notification_thread = self.scheduler._thread
 
     def stop_notification_service(self):
         self.is_running = False
-        # Cancel all scheduled tasks
-        for task_name, timer in self.scheduled_tasks.items():
-            timer.cancel()
-        self.scheduled_tasks.clear()
-        if self.notification_thread:
-            self.notification_thread.join()
-            #print("Notification service stopped")  # Debug print
\ No newline at end of file
+        self._write_last_run(datetime.now())
+        # Cancel all scheduled reminders
+        self.scheduler.stop()
+        self.scheduler.clear()
+        self.notification_thread = None
+        if self.root and self._drain_job is not None:
+            try:
+                self.root.after_cancel(self._drain_job)
+            except tk.TclError:
+                pass  # The window is already gone
+            self._drain_job = None
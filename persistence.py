@@ -0,0 +1,59 @@
+import threading
+
+class PersistenceWorker:
+    """Background thread that runs the slow snapshot writes off the UI thread.
+    
+    Jobs are submitted under a name. Submitting a name that is already
+    queued replaces the queued job, so a burst of edits collapses into one
+    write. Jobs read the current state when they run, so that one write
+    always saves the latest data.
+    """
+    def __init__(self, on_error=None):
+        self.on_error = on_error  # Called as on_error(name, exception) from the worker thread
+        self._jobs = {}  # name -> callable, in submission order
+        self._busy = False
+        self._stopped = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="persistence-worker")
+        self._thread.start()
+        
+    def submit(self, name, job):
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("persistence worker is stopped")
+            self._jobs[name] = job
+            self._cond.notify_all()
+            
+    def flush(self, timeout=None):
+        """Block until every submitted job has been written"""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._jobs and not self._busy, timeout)
+            
+    def stop(self, timeout=None):
+        """Flush the queue and end the thread; used as the on-exit hook"""
+        self.flush(timeout)
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._jobs or self._stopped)
+                if not self._jobs:
+                    return
+                name = next(iter(self._jobs))
+                job = self._jobs.pop(name)
+                self._busy = True
+            try:
+                job()
+            except Exception as e:
+                if self.on_error:
+                    self.on_error(name, e)
+                else:
+                    print(f"Error writing {name}: {e}")
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
@@ -0,0 +1,126 @@
+from collections import defaultdict
+import re
+import numpy as np
+from cells import is_blank
+
+# Runs of word characters, the pieces a query is looked up by
+TOKEN = re.compile(r"\w+")
+
+# Separator between the texts of a chunk tokenized in one pass
+BREAK = "\x01"
+
+# The other ASCII characters that are not word characters, turned into spaces before splitting.
+# Tokens are then split at those and at whitespace, which never cuts through a run of word
+# characters; other punctuation stays inside a token, which still contains every run it spans
+SEPARATORS = str.maketrans({chr(code): " " for code in range(128)
+                            if not (chr(code).isalnum() or chr(code) in "_" + BREAK)})
+
+# Rows tokenized per pass while building, which bounds the token strings alive at once
+BUILD_CHUNK = 8192
+
+# Rows re-indexed since the build that are kept aside before the index asks to be rebuilt...
+MIN_PENDING = 4096
+
+# ...raised to one row in this many, so a large list is not rebuilt after every few edits
+PENDING_RATIO = 8
+
+def lower_text(value):
+    """Lowercase a Title/Description value, as the search matches it"""
+    return value.lower() if isinstance(value, str) else "" if is_blank(value) else str(value).lower()
+
+def row_tokens(title, description):
+    """Distinct lowercased tokens of a task's Title and Description"""
+    return set((lower_text(title) + " " + lower_text(description)).translate(SEPARATORS).split())
+
+class SearchIndex:
+    """Inverted token index over Title and Description, keyed by table row.
+
+    The build packs the postings into two arrays: the rows of every
+    token, concatenated in token order, and the offset where each token's
+    rows start. Rows changed afterwards are masked out of those arrays
+    and kept in small side postings instead, until there are enough of
+    them that rebuilding is cheaper (see needs_rebuild).
+
+    A query matches the tokens containing each of its runs of word
+    characters; the vocabulary is scanned for those, which is far
+    smaller than the texts. candidates() returns the rows of the
+    matching tokens, which are exactly the matches when the query is a
+    single run and a superset to confirm against the texts otherwise.
+    """
+    def __init__(self, titles, descriptions):
+        import pandas as pd
+        ids = {}  # token -> position in vocabulary
+        size = len(titles)
+        pairs = []
+        for start in range(0, size, BUILD_CHUNK):
+            for column in (titles, descriptions):
+                # One pass over the whole chunk; the BREAK tokens count off the rows
+                texts = [(value if isinstance(value, str) else "" if is_blank(value) else str(value))
+                         .replace(BREAK, " ") for value in column[start:start + BUILD_CHUNK]]
+                tokens = (" " + BREAK + " ").join(texts).lower().translate(SEPARATORS).split()
+                codes, uniques = pd.factorize(np.array(tokens, dtype=object))
+                breaks = codes == (uniques.tolist().index(BREAK) if BREAK in uniques else -1)
+                rows = start + np.cumsum(breaks)[~breaks]
+                vocabulary = np.array([ids.setdefault(token, len(ids)) for token in uniques], dtype=np.int64)
+                pairs.append(vocabulary[codes[~breaks]] * size + rows)
+        # Sorted by token, then row; a token repeated within a row is kept once
+        pairs = np.unique(np.concatenate(pairs)) if pairs else np.zeros(0, dtype=np.int64)
+        token_ids = pairs // max(size, 1)
+        self.vocabulary = list(ids)
+        self._rows = (pairs % max(size, 1)).astype(np.int32)
+        self._offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(token_ids, minlength=len(ids)), out=self._offsets[1:])
+        self.size = size  # Rows covered by the arrays
+        self._stale = np.zeros(self.size, dtype=bool)  # Rows whose entries in the arrays are out of date
+        self._pending = {}  # row -> tokens, for rows indexed since the build
+        self._pending_postings = defaultdict(set)  # token -> rows in _pending
+
+    def __len__(self):
+        return len(self._rows)
+
+    def update(self, row, title, description):
+        """Re-index a row that was added or changed"""
+        self.remove(row)
+        tokens = row_tokens(title, description)
+        self._pending[row] = tokens
+        for token in tokens:
+            self._pending_postings[token].add(row)
+
+    def remove(self, row):
+        if row < self.size:
+            self._stale[row] = True
+        for token in self._pending.pop(row, ()):
+            rows = self._pending_postings[token]
+            rows.discard(row)
+            if not rows:
+                del self._pending_postings[token]
+
+    def needs_rebuild(self):
+        return len(self._pending) > max(MIN_PENDING, self.size // PENDING_RATIO)
+
+    def candidates(self, text):
+        """(sorted rows, exact) for a lowercased query, or None if it has no word characters"""
+        pieces = set(TOKEN.findall(text))
+        if not pieces:
+            return None
+        found = None
+        # The longest run usually matches the fewest tokens
+        for piece in sorted(pieces, key=len, reverse=True):
+            rows = self._matching_rows(piece)
+            found = rows if found is None else np.intersect1d(found, rows, assume_unique=True)
+            if not len(found):
+                break
+        return found, pieces == {text}
+
+    def _matching_rows(self, piece):
+        offsets = self._offsets
+        parts = [self._rows[offsets[i]:offsets[i + 1]]
+                 for i, token in enumerate(self.vocabulary) if piece in token]
+        rows = np.concatenate(parts) if parts else np.zeros(0, dtype=np.int32)
+        rows = rows[~self._stale[rows]]
+        pending = [row for token, token_rows in self._pending_postings.items() if piece in token
+                   for row in token_rows]
+        if pending:
+            rows = np.concatenate([rows, np.array(pending, dtype=np.int32)])
+        # A row holding several matching tokens appears once per token
+        return np.unique(rows)
@@ -0,0 +1,79 @@
+import threading
+from persistence import PersistenceWorker
+
+# Pause after the last keystroke before a query is run
+DEBOUNCE_MS = 150
+
+# How often the Tk thread checks for a finished query
+POLL_MS = 20
+
+def narrows(old_params, new_params):
+    """Whether every task matching new_params also matched old_params, e.g. one more character typed"""
+    if any(old_params[key] != new_params[key] for key in new_params if key != "search_text"):
+        return False
+    return old_params["search_text"].lower() in new_params["search_text"].lower()
+
+class SearchPipeline:
+    """Runs filter-bar queries off the Tk thread and shows only the newest result.
+    
+    Keystrokes are debounced, and each query gets a generation number. A
+    query superseded before it starts is skipped (the worker keeps only
+    the newest job), and one superseded while running has its result
+    dropped. The last applied (params, result) pair is handed to the next
+    query so a narrowing query can refine it instead of rescanning.
+    """
+    def __init__(self, widget, run, apply, delay=DEBOUNCE_MS):
+        self.widget = widget  # Any Tk widget, used for after()
+        self.run = run  # (params, previous) -> result, called on the worker thread
+        self.apply = apply  # result -> None, called on the Tk thread
+        self.delay = delay
+        # Same coalescing worker as the snapshot writes: a newer job replaces a queued one
+        self.worker = PersistenceWorker(on_error=lambda name, e: print(f"Error running search: {e}"))
+        self._generation = 0
+        self._applied = 0  # Generation of the result on screen
+        self._last = None  # (params, result) on screen
+        self._done = None  # (generation, params, result) handed back by the worker
+        self._lock = threading.Lock()
+        self._pending = None  # after() id of the debounced start
+        self._polling = None  # after() id of the next poll
+        
+    def submit(self, params, delay=None):
+        """Queue a query; params are keyword arguments for run, including search_text"""
+        if self._pending is not None:
+            self.widget.after_cancel(self._pending)
+        self._pending = self.widget.after(self.delay if delay is None else delay, lambda: self._start(params))
+        
+    def _start(self, params):
+        self._pending = None
+        self._generation += 1
+        generation = self._generation
+        previous = self._last
+        
+        def job():
+            if generation != self._generation:
+                return  # A newer query is already waiting
+            try:
+                result = self.run(params, previous)
+            except Exception as e:
+                print(f"Error running search: {e}")
+                result = None
+            with self._lock:
+                self._done = (generation, params, result)
+                
+        self.worker.submit("search", job)
+        if self._polling is None:
+            self._polling = self.widget.after(POLL_MS, self._poll)
+            
+    def _poll(self):
+        self._polling = None
+        with self._lock:
+            done, self._done = self._done, None
+        if done is not None and done[0] == self._generation:
+            generation, params, result = done
+            self._applied = generation
+            if result is not None:
+                self._last = (params, result)
+                self.apply(result)
+        # Keep polling until the newest query has come back
+        if self._applied != self._generation:
+            self._polling = self.widget.after(POLL_MS, self._poll)
@@ -0,0 +1,173 @@
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from datetime import datetime, timedelta
+from instrumentation import instruments
+
+# How often the Tk thread is asked to run the heartbeat
+HEARTBEAT_MS = 100
+
+# How long the heartbeat may go unserviced before it counts as a stall
+STALL_THRESHOLD = 1.0
+
+# How often the watchdog thread checks the heartbeat, and samples the stack during a stall
+POLL_INTERVAL = 0.1
+
+# Most stack samples kept per stall; a longer stall keeps sampling into the counts it has
+MAX_SAMPLES = 200
+
+# Most stall reports kept on disk; the oldest are removed first
+MAX_REPORTS = 50
+
+def _in_tkinter(frame):
+    return os.path.basename(os.path.dirname(frame.f_code.co_filename)) == "tkinter"
+
+def _describe(frame):
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+def triggering_callback(frame):
+    """The Tk callback a stack is running: the first frame called back out of tkinter, or None"""
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    entered = False
+    for frame in reversed(frames):  # Outermost first
+        if _in_tkinter(frame):
+            entered = True
+        elif entered:
+            return _describe(frame)
+    return None
+
+class MainLoopWatchdog:
+    """Thread that notices when the Tk main loop stops running callbacks.
+
+    The Tk thread runs a heartbeat every HEARTBEAT_MS through root.after.
+    When the watchdog thread sees no heartbeat for STALL_THRESHOLD seconds
+    it samples the Tk thread's Python stack until the heartbeat comes back,
+    and writes a report with the duration, the callback that was running
+    and the stacks seen, most frequent first. A report is written as soon
+    as a stall is detected and rewritten when it ends, so a freeze that
+    never recovers still leaves one behind.
+    """
+    def __init__(self, root, report_dir, threshold=STALL_THRESHOLD, on_stall=None):
+        self.root = root
+        self.report_dir = report_dir
+        self.threshold = threshold
+        self.on_stall = on_stall  # Called as on_stall(report path, seconds) from the watchdog thread
+        self.stalls = 0
+        self._tk_thread = None  # Ident of the thread running the heartbeat
+        self._last_beat = None  # time.monotonic() of the last heartbeat; None until the first
+        self._beat_job = None
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        # Nothing is timed until the first heartbeat, so building the window does not count
+        self._beat_job = self.root.after(HEARTBEAT_MS, self._beat)
+        self._thread = threading.Thread(target=self._run, daemon=True, name="main-loop-watchdog")
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._beat_job is not None:
+            try:
+                self.root.after_cancel(self._beat_job)
+            except Exception:
+                pass  # The window is already gone
+            self._beat_job = None
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _beat(self):
+        self._tk_thread = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._beat_job = self.root.after(HEARTBEAT_MS, self._beat)
+
+    def _run(self):
+        stall = None
+        last_poll = time.monotonic()
+        while not self._stopping.wait(POLL_INTERVAL):
+            now = time.monotonic()
+            slept, last_poll = now - last_poll, now
+            last_beat = self._last_beat
+            if last_beat is None:
+                continue
+            if stall is None and slept > self.threshold:
+                # This thread was held up too, e.g. by a suspended machine; that is no stall of the loop
+                self._last_beat = now
+                continue
+            if stall is not None:
+                if last_beat > stall["last_beat"]:
+                    # The heartbeat came back; its late run ends the stall
+                    stall["duration"] = last_beat - stall["last_beat"]
+                    self._finish(stall)
+                    stall = None
+                else:
+                    self._sample(stall)
+            elif now - last_beat > self.threshold:
+                stall = {"last_beat": last_beat, "started": datetime.now() - timedelta(seconds=now - last_beat),
+                         "stacks": Counter(), "samples": 0, "callback": None, "path": None}
+                self._sample(stall)
+                self._write(stall)
+
+    def _sample(self, stall):
+        frame = sys._current_frames().get(self._tk_thread)
+        if frame is None:
+            return
+        if stall["callback"] is None:
+            stall["callback"] = triggering_callback(frame)
+        stack = "".join(traceback.format_stack(frame))
+        if stall["samples"] < MAX_SAMPLES or stack in stall["stacks"]:
+            stall["stacks"][stack] += 1
+        stall["samples"] += 1
+
+    def _finish(self, stall):
+        self.stalls += 1
+        instruments.observe("mainloop.stall", stall["duration"] * 1000)
+        instruments.count("mainloop.stalls")
+        self._write(stall)
+        if self.on_stall and stall["path"]:
+            self.on_stall(stall["path"], stall["duration"])
+
+    def _write(self, stall):
+        try:
+            os.makedirs(self.report_dir, exist_ok=True)
+            if stall["path"] is None:
+                name = f"stall-{stall['started'].strftime('%Y%m%d-%H%M%S-%f')}.txt"
+                stall["path"] = os.path.join(self.report_dir, name)
+                self._prune()
+            with open(stall["path"], "w", encoding="utf-8") as f:
+                f.write(self.format_report(stall))
+        except OSError as e:
+            print(f"Error writing stall report: {e}")
+
+    def format_report(self, stall):
+        duration = stall.get("duration")
+        lines = [
+            f"Main loop stalled for {duration:.2f} s" if duration is not None
+            else "Main loop stalled (still blocked when this was written)",
+            f"Started: {stall['started'].isoformat(sep=' ', timespec='milliseconds')}",
+            f"Callback: {stall['callback'] or 'unknown'}",
+            f"Threshold: {self.threshold:.2f} s",
+            "",
+        ]
+        for stack, seen in stall["stacks"].most_common():
+            lines.append(f"Stack in {seen} of {stall['samples']} samples:")
+            lines.append(stack)
+        return "\n".join(lines)
+
+    def _prune(self):
+        reports = sorted(name for name in os.listdir(self.report_dir)
+                         if name.startswith("stall-") and name.endswith(".txt"))
+        for name in reports[:max(0, len(reports) - MAX_REPORTS + 1)]:
+            try:
+                os.remove(os.path.join(self.report_dir, name))
+            except OSError:
+                pass
@@ -0,0 +1,580 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+from datetime import date, timedelta
+from journal import Journal
+from history_store import HistoryStore
+from task_snapshot import MappedSnapshot
+from instrumentation import span
+from cells import is_blank
+
+# pandas (with openpyxl) is slow to import, so it is only imported by the Excel format that
+# reads and writes its files; the mapped snapshot the app starts from does not need it
+
+# Number of journal records that triggers a background compaction into the snapshot
+COMPACT_THRESHOLD = 500
+
+# ...raised to one record per this many tasks, so a bulk import into a large list does not
+# rewrite the whole snapshot after every batch
+COMPACT_RATIO = 4
+
+# Permissions a new file gets here; mkstemp creates the snapshot's temporary file private to the user
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+# A Due Date stored in SQLite that the in-memory table would read as a date
+DATE_GLOB = "[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]"
+
+# Task fields in display order and the SQLite columns they are stored in
+TASK_COLUMNS = {
+    "Title": "title",
+    "Description": "description",
+    "Due Date": "due_date",
+    "Priority": "priority",
+    "Category": "category",
+    "Status": "status",
+    "Reminder Time": "reminder_time",
+    "ID": "task_id",
+}
+
+class StorageBackend:
+    """Where DatabaseManager persists its tasks and history.
+
+    Mutations arrive as records mirroring the journal: op is one of
+    "add", "update", "delete" or "clear", and tasks are addressed by ID.
+    History is append-only ("add" and "clear") and is read in pages.
+    """
+    # Whether record_task/record_history persist a single change cheaply.
+    # When False the manager rewrites the whole task list with save_tasks; history is
+    # append-only and always goes through record_history.
+    incremental = True
+
+    # Set by load_tasks when the tasks came from a file the backend does not write, so the
+    # manager saves them once, after giving them IDs
+    imported = False
+
+    def load_tasks(self):
+        raise NotImplementedError
+        
+    def map_tasks(self):
+        """(MappedSnapshot, journal records to replay on it), or None to use load_tasks()"""
+        return None
+
+    def load_history(self):
+        """The whole history as a list; prefer read_history() for display"""
+        return self.read_history(0, self.history_count())
+        
+    def history_count(self):
+        raise NotImplementedError
+        
+    def read_history(self, start, count):
+        raise NotImplementedError
+        
+    def reload_history(self):
+        """Pick up history files replaced behind the backend's back"""
+        pass
+
+    def save_tasks(self, tasks, checkpoint=None):
+        raise NotImplementedError
+
+    def save_history(self, history_tasks, checkpoint=None):
+        raise NotImplementedError
+
+    def record_task(self, op, task_id=None, task=None):
+        raise NotImplementedError
+
+    def record_history(self, op, task=None):
+        raise NotImplementedError
+
+    def record_tasks(self, op, tasks):
+        """Record a batch of "add" or "update" changes; backends override this to write them at once"""
+        for task in tasks:
+            self.record_task(op, task_id=task["ID"] if op == "update" else None, task=task)
+            
+    def extend_history(self, tasks):
+        """Append a batch of history rows"""
+        for task in tasks:
+            self.record_history("add", task=task)
+            
+    def query_tasks(self, query, search_text=""):
+        """IDs of the tasks matching a TaskQuery's predicates and search_text, answered from the
+        store's own indexes, or None to leave the query to the in-memory table"""
+        return None
+
+    def needs_compaction(self, task_count=0):
+        return False
+
+    def checkpoint(self):
+        """Mark what a following save or compact() covers; called with the manager locked"""
+        return None
+
+    def compact(self, tasks, checkpoint):
+        pass
+
+    def close(self):
+        pass
+
+class SnapshotFormat:
+    """File format of a task snapshot; the snapshot records the last journal sequence it includes"""
+    extension = None
+    
+    def read(self, path):
+        """Return (tasks, seq) from a snapshot file"""
+        raise NotImplementedError
+        
+    def open(self, path):
+        """A MappedSnapshot of the file, for formats that can be mapped instead of read"""
+        return None
+        
+    def write(self, path, tasks, seq=None):
+        raise NotImplementedError
+
+class ExcelFormat(SnapshotFormat):
+    """.xlsx through openpyxl; slow, so only used to import and export"""
+    extension = ".xlsx"
+    
+    def read(self, path):
+        import pandas as pd
+        # Timed apart, so a slow import shows whether openpyxl or the pandas conversion is to blame
+        with span("excel.parse"):
+            df = pd.read_excel(path, dtype={"ID": str})
+        # Ensure Reminder Time column exists
+        if 'Reminder Time' not in df.columns:
+            df['Reminder Time'] = ''
+        with span("excel.to_records"):
+            return df.to_dict("records"), 0
+        
+    def write(self, path, tasks, seq=None):
+        import pandas as pd
+        with span("excel.to_frame"):
+            df = pd.DataFrame(tasks)
+        with span("excel.write"):
+            df.to_excel(path, index=False)
+
+class MappedFormat(SnapshotFormat):
+    """Fixed-width columns plus a string heap (task_snapshot.py), memory-mapped rather than parsed.
+    
+    The file is replaced, never written in place, so other processes
+    mapping it keep a consistent view. Windows refuses to replace a file
+    that is still mapped, though, so there a second instance open on the
+    same data directory makes snapshot writes fail until it closes; the
+    journal keeps the changes meanwhile.
+    """
+    extension = ".snap"
+    
+    def open(self, path):
+        return MappedSnapshot(path)
+        
+    def read(self, path):
+        from task_table import TaskTable  # task_table imports this module
+        snapshot = MappedSnapshot(path)
+        table = TaskTable()
+        table.load_mapped(snapshot)
+        return table.to_records(), snapshot.seq
+        
+    def write(self, path, tasks, seq=None):
+        from task_table import TaskTable
+        # Encode through a table so the file holds exactly what load_mapped() expects
+        table = TaskTable()
+        table.load(tasks)
+        table.save_mapped(path, seq)
+
+class SnapshotBackend(StorageBackend):
+    """Snapshot file of the tasks with an append-only journal of the changes made since.
+    
+    The snapshot is a memory-mapped file. If it does not exist yet, the
+    tasks are imported from the old Excel file of the same name (e.g.
+    tasks.xlsx).
+    
+    History lives in a chunked store next to the snapshot (data/history/);
+    an existing history.xlsx is imported into it the first time.
+    """
+    def __init__(self, tasks_file, history_file, use_journal=True):
+        self.format = MappedFormat()
+        root = os.path.splitext(tasks_file)[0]
+        self.tasks_file = root + self.format.extension
+        self.history_file = history_file
+        # Where to look for the tasks before the first snapshot is written
+        self.import_files = [root + ExcelFormat.extension]
+        self.incremental = use_journal
+        self.tasks_journal = Journal(root + ".journal")
+        self.history = HistoryStore(os.path.splitext(history_file)[0])
+        if not self.history.exists():
+            self._import_legacy_history()
+            
+    def _import_legacy_history(self):
+        # history.xlsx is left in place as it was; the store takes over from here
+        tasks = []
+        if os.path.exists(self.history_file):
+            tasks, _ = ExcelFormat().read(self.history_file)
+        self.history.replace(tasks)
+
+    def load_tasks(self):
+        if os.path.exists(self.tasks_file):
+            tasks, seq = self.format.read(self.tasks_file)
+            return replay_records(tasks, self.tasks_journal.recover(seq))
+            
+        for path in self.import_files:
+            if os.path.exists(path):
+                # The old Excel file is kept as it was
+                tasks, seq = snapshot_format_for(path).read(path)
+                self.imported = True
+                return replay_records(tasks, self.tasks_journal.recover(seq))
+        return replay_records([], self.tasks_journal.recover(0))
+        
+    def map_tasks(self):
+        snapshot = self.format.open(self.tasks_file) if os.path.exists(self.tasks_file) else None
+        if snapshot is None:
+            return None
+        return snapshot, self.tasks_journal.recover(snapshot.seq)
+
+    def history_count(self):
+        return len(self.history)
+        
+    def read_history(self, start, count):
+        return self.history.read(start, count)
+        
+    def reload_history(self):
+        self.history.reload()
+
+    def save_tasks(self, tasks, checkpoint=None):
+        seq = checkpoint["tasks"] if checkpoint else self.tasks_journal.seq
+        # Write to a temporary file first so a crash never leaves a half-written snapshot
+        root, ext = os.path.splitext(self.tasks_file)
+        fd, tmp_path = tempfile.mkstemp(suffix=ext, prefix=os.path.basename(root) + ".",
+                                        dir=os.path.dirname(self.tasks_file) or ".")
+        os.close(fd)
+        try:
+            self.format.write(tmp_path, tasks, seq)
+            try:
+                mode = os.stat(self.tasks_file).st_mode & 0o777
+            except FileNotFoundError:
+                mode = 0o666 & ~UMASK
+            os.chmod(tmp_path, mode)
+            with open(tmp_path, "rb+") as f:
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.tasks_file)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        # The journal records are only dropped once the snapshot holding them is on disk
+        fsync_directory(os.path.dirname(self.tasks_file) or ".")
+        self.tasks_journal.truncate(seq)
+        
+    def save_history(self, history_tasks, checkpoint=None):
+        self.history.replace(history_tasks)
+
+    def record_task(self, op, task_id=None, task=None):
+        self.tasks_journal.append(op, id=task_id, task=task)
+
+    def record_tasks(self, op, tasks):
+        self.tasks_journal.extend(op, [{"id": task["ID"] if op == "update" else None, "task": task}
+                                       for task in tasks])
+                                       
+    def record_history(self, op, task=None):
+        # The history store is append-only, so it needs no journal of its own
+        if op == "add":
+            self.history.append(task)
+        elif op == "clear":
+            self.history.clear()
+
+    def extend_history(self, tasks):
+        self.history.extend(tasks)
+        
+    def needs_compaction(self, task_count=0):
+        return self.tasks_journal.length >= max(COMPACT_THRESHOLD, task_count // COMPACT_RATIO)
+
+    def checkpoint(self):
+        # The journal records that the list copied alongside already includes
+        return {"tasks": self.tasks_journal.seq}
+
+    def compact(self, tasks, checkpoint):
+        # Only rewrite the snapshot if it has pending records
+        if self.tasks_journal.length:
+            self.save_tasks(tasks, checkpoint)
+
+    def close(self):
+        self.tasks_journal.close()
+        self.history.close()
+
+def fsync_directory(path):
+    """Make a rename in the directory durable; skipped where directories cannot be opened (Windows)"""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def snapshot_format_for(path):
+    """Snapshot format of a file, from its extension"""
+    for fmt in (MappedFormat, ExcelFormat):
+        if path.endswith(fmt.extension):
+            return fmt()
+    raise ValueError(f"Unknown snapshot format: {path}")
+
+class SQLiteBackend(StorageBackend):
+    """SQLite database in WAL mode with indexes on the filterable columns"""
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # Python's lower() keeps the search semantics of the in-memory filter for non-ASCII text
+        self._conn.create_function("py_lower", 1, lambda s: (s or "").lower(), deterministic=True)
+        self._create_schema()
+        self._history_count = None  # Cached row count of the history table
+
+    def _create_schema(self):
+        columns = ", ".join(f"{column} TEXT" for column in TASK_COLUMNS.values())
+        with self._lock, self._conn:
+            for table in ("tasks", "history"):
+                self._conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (id INTEGER PRIMARY KEY, {columns})")
+            self._conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_tasks_task_id ON tasks (task_id)")
+            for column in ("priority", "category", "status", "due_date", "reminder_time"):
+                self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_tasks_{column} ON tasks ({column})")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def get_meta(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    @staticmethod
+    def _values(task):
+        values = []
+        for field in TASK_COLUMNS:
+            value = task.get(field)
+            values.append(None if is_blank(value) else str(value))
+        return values
+
+    def _select(self, table, where="", params=(), limit=""):
+        columns = ", ".join(TASK_COLUMNS.values())
+        with self._lock:
+            rows = self._conn.execute(f"SELECT id, {columns} FROM {table} {where} ORDER BY id {limit}",
+                                      params).fetchall()
+        return rows
+
+    @staticmethod
+    def _to_task(row):
+        return {field: value if value is not None else "" for field, value in zip(TASK_COLUMNS, row[1:])}
+
+    def load_tasks(self):
+        return [self._to_task(row) for row in self._select("tasks")]
+
+    def history_count(self):
+        if self._history_count is None:
+            with self._lock:
+                self._history_count = self._conn.execute("SELECT COUNT(*) FROM history").fetchone()[0]
+        return self._history_count
+        
+    def read_history(self, start, count):
+        return [self._to_task(row) for row in self._select("history", "", (count, start), "LIMIT ? OFFSET ?")]
+        
+    def reload_history(self):
+        self._history_count = None
+
+    def _replace(self, table, tasks):
+        placeholders = ", ".join("?" for _ in TASK_COLUMNS)
+        columns = ", ".join(TASK_COLUMNS.values())
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {table}")
+            self._conn.executemany(f"INSERT INTO {table} ({columns}) VALUES ({placeholders})",
+                                   (self._values(task) for task in tasks))
+
+    def save_tasks(self, tasks, checkpoint=None):
+        self._replace("tasks", tasks)
+
+    def save_history(self, history_tasks, checkpoint=None):
+        self._replace("history", history_tasks)
+        self._history_count = None
+
+    def _insert(self, table, task):
+        placeholders = ", ".join("?" for _ in TASK_COLUMNS)
+        columns = ", ".join(TASK_COLUMNS.values())
+        self._conn.execute(f"INSERT INTO {table} ({columns}) VALUES ({placeholders})",
+                           self._values(task))
+
+    def record_task(self, op, task_id=None, task=None):
+        with self._lock, self._conn:
+            if op == "add":
+                self._insert("tasks", task)
+            elif op == "update":
+                assignments = ", ".join(f"{column} = ?" for column in TASK_COLUMNS.values())
+                self._conn.execute(f"UPDATE tasks SET {assignments} WHERE task_id = ?",
+                                   self._values(task) + [task_id])
+            elif op == "delete":
+                self._conn.execute("DELETE FROM tasks WHERE task_id = ?", (task_id,))
+            elif op == "clear":
+                self._conn.execute("DELETE FROM tasks")
+
+    def record_tasks(self, op, tasks):
+        # One transaction for the whole batch
+        with self._lock, self._conn:
+            if op == "add":
+                placeholders = ", ".join("?" for _ in TASK_COLUMNS)
+                columns = ", ".join(TASK_COLUMNS.values())
+                self._conn.executemany(f"INSERT INTO tasks ({columns}) VALUES ({placeholders})",
+                                       (self._values(task) for task in tasks))
+            elif op == "update":
+                assignments = ", ".join(f"{column} = ?" for column in TASK_COLUMNS.values())
+                self._conn.executemany(f"UPDATE tasks SET {assignments} WHERE task_id = ?",
+                                       (self._values(task) + [task["ID"]] for task in tasks))
+                                       
+    def extend_history(self, tasks):
+        placeholders = ", ".join("?" for _ in TASK_COLUMNS)
+        columns = ", ".join(TASK_COLUMNS.values())
+        with self._lock, self._conn:
+            self._conn.executemany(f"INSERT INTO history ({columns}) VALUES ({placeholders})",
+                                   (self._values(task) for task in tasks))
+            if self._history_count is not None:
+                self._history_count += len(tasks)
+                
+    def record_history(self, op, task=None):
+        with self._lock, self._conn:
+            if op == "add":
+                self._insert("history", task)
+                if self._history_count is not None:
+                    self._history_count += 1
+            elif op == "clear":
+                self._conn.execute("DELETE FROM history")
+                self._history_count = 0
+
+    def query_tasks(self, query, search_text=""):
+        # Only constrain the columns that are filtered so SQLite can pick the matching index
+        conditions = []
+        params = []
+        for column, values in (("priority", query.priority), ("category", query.category),
+                               ("status", query.status)):
+            if values == "All":
+                continue
+            values = [values] if isinstance(values, str) else list(values)
+            # Empty cells are stored as NULL
+            condition = f"{column} IN ({', '.join('?' * len(values))})"
+            if "" in values:
+                condition = f"({condition} OR {column} IS NULL)"
+            conditions.append(condition)
+            params.extend(values)
+        if query.due_from or query.due_to or query.overdue:
+            # Text that is not a date never matches a date range, as in the table
+            conditions.append(f"due_date GLOB '{DATE_GLOB}'")
+        if query.due_from:
+            conditions.append("due_date >= ?")
+            params.append(query.due_from[:10])
+        if query.due_to:
+            # Inclusive of the whole last day
+            conditions.append("due_date < ?")
+            params.append((date.fromisoformat(query.due_to[:10]) + timedelta(days=1)).isoformat())
+        if query.overdue:
+            conditions.append("due_date < ? AND (status IS NULL OR status != 'Completed')")
+            params.append(date.today().isoformat())
+        if query.has_reminder is not None:
+            conditions.append("reminder_time IS NOT NULL" if query.has_reminder else "reminder_time IS NULL")
+        if search_text:
+            conditions.append("(instr(py_lower(title), ?) > 0 OR instr(py_lower(description), ?) > 0)")
+            params.extend([search_text.lower()] * 2)
+        if not conditions:
+            return None  # Every task; nothing for an index to narrow
+        with self._lock:
+            rows = self._conn.execute(f"SELECT task_id FROM tasks WHERE {' AND '.join(conditions)}",
+                                      params).fetchall()
+        return [row[0] for row in rows]
+
+    def compact(self, tasks, checkpoint):
+        # Fold the WAL back into the main database file, e.g. before a backup copies it
+        with self._lock:
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def task_key(task):
+    """Key of a task in an ID-addressed map; rows saved before tasks had IDs get a unique stand-in"""
+    task_id = task.get("ID")
+    return task_id if isinstance(task_id, str) and task_id else object()
+
+def replay_records(tasks, records):
+    """Apply journal records to the task list read from a snapshot"""
+    if not records:
+        return tasks
+    by_id = {task_key(task): task for task in tasks}
+    for record in records:
+        op = record["op"]
+        if op == "clear":
+            by_id.clear()
+            continue
+        if op == "add":
+            by_id[task_key(record["task"])] = record["task"]
+            continue
+            
+        key = record.get("id")
+        if key not in by_id:
+            continue
+        if op == "update":
+            by_id[key] = record["task"]
+        elif op == "delete":
+            del by_id[key]
+    return list(by_id.values())
+
+def replay_into(table, records):
+    """Apply journal records to a TaskTable in place, like replay_records"""
+    added = {}  # A run of new tasks, appended in one batch, e.g. after a bulk import
+    for record in records:
+        op = record["op"]
+        if op == "add" and record["task"]["ID"] not in table and record["task"]["ID"] not in added:
+            added[record["task"]["ID"]] = record["task"]
+            continue
+        if added:
+            table.extend(list(added.values()))
+            added = {}
+        if op == "clear":
+            table.clear()
+        elif op == "add":
+            task = record["task"]
+            if task["ID"] in table:
+                table.update(task["ID"], task)
+            else:
+                table.append(task)
+        elif record.get("id") in table:
+            if op == "update":
+                table.update(record["id"], record["task"])
+            elif op == "delete":
+                table.delete(record["id"])
+    if added:
+        table.extend(list(added.values()))
+
+def migrate_to_sqlite(tasks_file, history_file, db_file):
+    """Import the snapshot data (and any pending journal records) into SQLite once"""
+    sqlite = SQLiteBackend(db_file)
+    try:
+        # The key predates the snapshot formats, when the data could only come from Excel
+        if sqlite.get_meta("migrated_from_excel"):
+            return False
+        snapshot = SnapshotBackend(tasks_file, history_file)
+        try:
+            sqlite.save_tasks(snapshot.load_tasks())
+            sqlite.save_history(snapshot.load_history())
+        finally:
+            snapshot.close()
+        sqlite.set_meta("migrated_from_excel", tasks_file)
+        return True
+    finally:
+        sqlite.close()
+
+if __name__ == "__main__":
+    # python storage.py [data_dir]
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else "data"
+    migrated = migrate_to_sqlite(os.path.join(data_dir, "tasks.xlsx"),
+                                       os.path.join(data_dir, "history.xlsx"),
+                                       os.path.join(data_dir, "tasks.db"))
+    print("Migrated the task data to SQLite" if migrated else "SQLite database was already migrated")
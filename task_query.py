@@ -0,0 +1,112 @@
+import numpy as np
+from task_table import CODE_FIELDS, DATE_FIELDS, TEXT_FIELDS
+
+# Sort rank of the built-in priorities; other values sort after them alphabetically
+PRIORITY_ORDER = ("High", "Medium", "Low")
+
+class TaskQuery:
+    """Filter, sort and paging options for TaskTable.
+    
+    Every predicate is evaluated as a boolean mask over the table's columns.
+    Sorting runs one np.lexsort over the whole table, which is cached until
+    the table changes; a filtered query then just picks the masked rows out
+    of that order, so re-filtering a sorted list stays cheap.
+    
+    sort is a list of (field, ascending) pairs, most significant first.
+    Dates are "YYYY-MM-DD" strings; statuses and categories can be a
+    single value or a collection of values.
+    """
+    def __init__(self, priority="All", category="All", status="All", due_from=None, due_to=None,
+                 overdue=False, has_reminder=None, sort=(), offset=0, limit=None):
+        self.priority = priority
+        self.category = category
+        self.status = status
+        self.due_from = due_from
+        self.due_to = due_to
+        self.overdue = overdue  # Only unfinished tasks due before today
+        self.has_reminder = has_reminder  # True/False to require or exclude a reminder, None for either
+        self.sort = list(sort)
+        self.offset = offset
+        self.limit = limit
+        
+    def order(self, table):
+        """Row numbers of all live tasks in sort order, cached on the table until it changes"""
+        def compute():
+            rows = table.live_rows()
+            # lexsort treats its last key as the most significant
+            keys = []
+            for field, ascending in reversed(self.sort):
+                keys.extend(reversed(sort_keys(table, field, rows, ascending)))
+            return rows[np.lexsort(keys)]
+        return table.cached(("order", tuple(self.sort)), compute)
+        
+    def mask(self, table, today=None):
+        """Rows of table (live or dead) matching every predicate"""
+        mask = table.mask({"Priority": self.priority})
+        for field, values in (("Category", self.category), ("Status", self.status)):
+            if values == "All":
+                continue
+            if isinstance(values, str):
+                values = [values]
+            codes = [table.categories[field].codes[value] for value in values
+                     if value in table.categories[field].codes]
+            mask &= np.isin(table.column(field), codes)
+            
+        due = table.column("Due Date")
+        if self.due_from:
+            mask &= due >= np.datetime64(self.due_from, "m")
+        if self.due_to:
+            # Inclusive of the whole last day
+            mask &= due < np.datetime64(self.due_to, "D") + np.timedelta64(1, "D")
+        if self.overdue:
+            today = np.datetime64(today or "today", "D")
+            mask &= due < today
+            mask &= table.column("Status") != table.categories["Status"].codes.get("Completed", -1)
+        if self.has_reminder is not None:
+            has_reminder = ~np.isnat(table.column("Reminder Time")) | table.has_raw("Reminder Time")
+            mask &= has_reminder if self.has_reminder else ~has_reminder
+        return mask
+        
+    def run(self, table, mask=None, today=None):
+        """Matching rows as a TaskList in sort order; mask further restricts the rows, e.g. a text search"""
+        selected = self.mask(table, today)
+        if mask is not None:
+            selected &= mask
+        if self.sort:
+            order = self.order(table)
+            rows = order[selected[order]]
+        else:
+            rows = table.live_rows(selected)
+        stop = None if self.limit is None else self.offset + self.limit
+        return table.take(rows[self.offset:stop])
+
+def sort_keys(table, field, rows, ascending=True):
+    """Integer sort keys of field for rows, most significant first; empty values sort last"""
+    if field in TEXT_FIELDS:
+        # The table keeps the ranks of the lowercased texts up to date as rows change
+        values, ranks = table.text_ranks(field)
+        keys = ranks[rows]
+        # "" sorts before any other text, so only rank 0 can be empty
+        empty = keys == 0 if values and values[0] == "" else np.zeros(len(keys), dtype=bool)
+    elif field in CODE_FIELDS:
+        column = table.column(field)[rows]
+        values = table.categories[field].values
+        if field == "Priority":
+            order = sorted(range(len(values)), key=lambda code: (
+                PRIORITY_ORDER.index(values[code]) if values[code] in PRIORITY_ORDER else len(PRIORITY_ORDER),
+                values[code].lower()))
+        else:
+            order = sorted(range(len(values)), key=lambda code: values[code].lower())
+        rank = np.empty(len(values), dtype=np.int64)
+        rank[order] = np.arange(len(values))
+        keys = rank[column]
+        empty = column == 0
+    elif field in DATE_FIELDS:
+        column = table.column(field)[rows]
+        empty = np.isnat(column)
+        keys = column.astype(np.int64)
+    else:
+        raise KeyError(field)
+    if not ascending:
+        keys = -keys
+    return [empty, keys]
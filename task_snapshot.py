@@ -0,0 +1,94 @@
+import json
+import struct
+import numpy as np
+
+# File signature and layout version
+MAGIC = b"TODOSNAP"
+VERSION = 1
+
+# Every section starts on this boundary so its column can be viewed in place
+ALIGN = 8
+
+def _padding(size):
+    return -size % ALIGN
+
+def write_snapshot(path, count, fixed, texts, meta):
+    """Write count rows as a memory-mappable snapshot.
+    
+    fixed maps field names to numpy arrays of one fixed-width dtype each,
+    texts maps field names to lists of str, which go into a string heap
+    indexed by an array of count + 1 byte offsets. meta is any small JSON
+    data kept in the header (journal sequence, category values and so on).
+    """
+    sections = []  # (name, array), in file order
+    for field, column in fixed.items():
+        sections.append((field, np.ascontiguousarray(column)))
+    for field, values in texts.items():
+        encoded = [value.encode("utf-8") if isinstance(value, str) else str(value).encode("utf-8")
+                   for value in values]
+        offsets = np.zeros(count + 1, dtype="<u8")
+        np.cumsum(np.fromiter(map(len, encoded), dtype=np.uint64, count=count), out=offsets[1:])
+        sections.append((field + ".offsets", offsets))
+        sections.append((field + ".heap", np.frombuffer(b"".join(encoded), dtype=np.uint8)))
+        
+    # Section offsets are relative to the end of the header, so they are known before it is written
+    layout = {}
+    position = 0
+    for name, array in sections:
+        layout[name] = [position, array.dtype.str, len(array)]
+        position += array.nbytes + _padding(array.nbytes)
+    header = json.dumps({"count": count, "sections": layout, "meta": meta}, default=str).encode("utf-8")
+    header += b" " * _padding(len(MAGIC) + 16 + len(header))
+    
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<QQ", VERSION, len(header)))
+        f.write(header)
+        for name, array in sections:
+            f.write(array.tobytes())
+            f.write(b"\0" * _padding(array.nbytes))
+
+class MappedSnapshot:
+    """A snapshot file mapped into memory instead of read.
+    
+    Opening it only parses the header. Columns are numpy views straight
+    onto the mapping, and heap strings are decoded one row at a time as
+    they are asked for. The mapping is copy-on-write: pages stay shared
+    through the OS page cache with every other process reading the same
+    file until a row is changed, and changes never reach the file.
+    """
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"Not a task snapshot: {path}")
+            version, length = struct.unpack("<QQ", f.read(16))
+            if version != VERSION:
+                raise ValueError(f"Unsupported task snapshot version {version}: {path}")
+            header = json.loads(f.read(length).decode("utf-8"))
+        self.path = path
+        self.count = header["count"]
+        self.meta = header["meta"]
+        self.seq = self.meta.get("seq") or 0
+        
+        start = len(MAGIC) + 16 + length
+        buffer = np.asarray(np.memmap(path, dtype=np.uint8, mode="c"))
+        self._sections = {}
+        for name, (offset, dtype, size) in header["sections"].items():
+            dtype = np.dtype(dtype)
+            view = buffer[start + offset:start + offset + size * dtype.itemsize]
+            self._sections[name] = view.view(dtype)
+            
+    def column(self, field):
+        """The fixed-width column of field, viewed in place"""
+        return self._sections[field]
+        
+    def text(self, field, row):
+        offsets = self._sections[field + ".offsets"]
+        return self._sections[field + ".heap"][offsets[row]:offsets[row + 1]].tobytes().decode("utf-8")
+        
+    def texts(self, field, rows):
+        """Heap strings of field for many rows at once"""
+        offsets = self._sections[field + ".offsets"]
+        heap = self._sections[field + ".heap"].tobytes()
+        return [heap[start:stop].decode("utf-8")
+                for start, stop in zip(offsets[rows].tolist(), offsets[rows + 1].tolist())]
@@ -0,0 +1,588 @@
+from bisect import bisect_left
+from collections.abc import Mapping, Sequence
+from datetime import datetime
+import numpy as np
+from cells import is_blank
+from storage import TASK_COLUMNS
+from task_snapshot import write_snapshot
+from search_index import SearchIndex, lower_text
+
+# Task fields in display order
+FIELDS = tuple(TASK_COLUMNS)
+
+# Free text fields, kept as object arrays of str
+TEXT_FIELDS = ("Title", "Description", "ID")
+
+# Text fields kept in a mapped snapshot's string heap and only decoded when read
+HEAP_FIELDS = ("Title", "Description")
+
+# Small enumerations, kept as int16 codes into a per-field list of values
+CODE_FIELDS = ("Priority", "Category", "Status")
+
+# Changed rows re-ranked one at a time; a larger batch drops the ranks to be rebuilt in one pass
+MAX_RERANK = 64
+
+# Date fields, kept as datetime64 with NaT for empty cells, and the format they are shown in
+DATE_FIELDS = {"Due Date": "%Y-%m-%d", "Reminder Time": "%Y-%m-%d %H:%M"}
+DATE_UNITS = {"Due Date": "D", "Reminder Time": "m"}
+
+def sort_text(value):
+    """A text field's value as it sorts: lowercased, with anything that is not a str as its text"""
+    return value.lower() if isinstance(value, str) else str(value).lower()
+
+def parse_date(value, fmt):
+    """One cell as a datetime, or None; strptime is far cheaper than pd.to_datetime for a single str"""
+    if is_blank(value):
+        return None
+    if isinstance(value, str):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            return None
+    if isinstance(value, datetime):
+        # Including pandas Timestamps from Excel cells; NaT is the one that is not equal to itself
+        return value if value == value else None
+    # Anything else (e.g. numpy datetimes) is rare enough to pay for importing pandas
+    import pandas as pd
+    parsed = pd.to_datetime(value, format=fmt, errors="coerce")
+    return None if pd.isna(parsed) else parsed
+
+class Categories:
+    """Interned values of one enumerated field; code 0 is the empty value"""
+    def __init__(self):
+        self.values = [""]
+        self.codes = {"": 0}
+        
+    def code(self, value):
+        value = "" if is_blank(value) else str(value)
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+        
+    def encode(self, values):
+        import pandas as pd
+        # Factorize once, then intern only the distinct values
+        codes, uniques = pd.factorize(pd.Series(values, dtype=object), use_na_sentinel=True)
+        lookup = np.array([self.code(value) for value in uniques] + [0], dtype=np.int16)
+        return lookup[codes]
+
+class TaskRow(Mapping):
+    """Read-only dict-like view of one task in a TaskTable.
+    
+    It only holds the table and the task ID, so call sites that index tasks
+    by field name keep working while the data stays in the table's columns.
+    Copy it with dict(row) to get an editable task.
+    """
+    __slots__ = ("_table", "_id")
+    
+    def __init__(self, table, task_id):
+        self._table = table
+        self._id = task_id
+        
+    def __getitem__(self, field):
+        if field == "ID":
+            return self._id
+        return self._table.value(self._id, field)
+        
+    def __iter__(self):
+        return iter(self._table.fields_of(self._id))
+        
+    def __len__(self):
+        return len(self._table.fields_of(self._id))
+        
+    def __repr__(self):
+        return f"TaskRow({dict(self)!r})"
+
+class TaskList(Sequence):
+    """Lazy list of TaskRow views over a selection of task IDs.
+    
+    Views are only created for the items that are indexed or sliced, so a
+    VirtualTreeview showing 50k tasks only builds the rows in its window.
+    """
+    __slots__ = ("_table", "_ids", "rows", "version")
+    
+    def __init__(self, table, ids, rows=None, version=None):
+        self._table = table
+        self._ids = ids  # numpy array of task IDs, in list order
+        self.rows = rows  # Row numbers of the tasks, valid while the table is at version
+        self.version = version
+        
+    def __len__(self):
+        return len(self._ids)
+        
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [TaskRow(self._table, task_id) for task_id in self._ids[index]]
+        return TaskRow(self._table, self._ids[index])
+        
+    def __iter__(self):
+        for task_id in self._ids:
+            yield TaskRow(self._table, task_id)
+
+class TaskTable:
+    """Column-oriented store of the task list.
+    
+    Each field is a numpy array indexed by row. Rows keep the order the
+    tasks were added in; deleted rows are only marked dead and squeezed
+    out once they make up half of the table. Filters on the enumerated
+    fields are mask operations over the code arrays.
+    
+    load_mapped() adopts the columns of a memory-mapped snapshot as they
+    are. Title and Description then stay None until a row is read, or
+    until a bulk operation decodes them all.
+    
+    Text searches go through a SearchIndex built on the first search and
+    kept up to date by append, update and delete; it is rebuilt when the
+    row numbers change or enough rows have been re-indexed since. Sorts
+    on a text field use ranks kept the same way (see text_ranks).
+    """
+    def __init__(self):
+        self.categories = {field: Categories() for field in CODE_FIELDS}
+        self._raw = {}  # (field, ID) -> date text that did not parse, kept as it was
+        self._extras = {}  # ID -> fields outside FIELDS, e.g. extra Excel columns
+        self.version = 0  # Bumped by every change, to invalidate derived data such as sort orders
+        self._cache = {}
+        self._cache_version = None
+        self.clear()
+        
+    def clear(self):
+        self.version += 1
+        self._size = 0  # Rows in use, live or dead
+        self._mapped = None  # MappedSnapshot whose heap still holds undecoded rows
+        self._index = None  # SearchIndex over the rows, built by the first text search
+        self._ranks = {}  # field -> (sorted lowercased values, rank of each row), see text_ranks
+        self._dead = 0
+        self._rows = {}  # ID -> row
+        self._raw.clear()
+        self._extras.clear()
+        self._allocate(0)
+        
+    def _allocate(self, capacity):
+        self._columns = {field: np.empty(capacity, dtype=object) for field in TEXT_FIELDS}
+        self._columns.update({field: np.zeros(capacity, dtype=np.int16) for field in CODE_FIELDS})
+        self._columns.update({field: np.full(capacity, np.datetime64("NaT"), dtype="datetime64[m]")
+                              for field in DATE_FIELDS})
+        self._live = np.zeros(capacity, dtype=bool)
+        
+    def _grow(self, needed):
+        capacity = len(self._live)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, 64)
+        for field, column in self._columns.items():
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            if column.dtype.kind == "M":
+                grown[self._size:] = np.datetime64("NaT")
+            self._columns[field] = grown
+        live = np.zeros(capacity, dtype=bool)
+        live[:self._size] = self._live[:self._size]
+        self._live = live
+        for field, (values, ranks) in self._ranks.items():
+            grown = np.zeros(capacity, dtype=np.int64)
+            grown[:self._size] = ranks[:self._size]
+            self._ranks[field] = (values, grown)
+        
+    def __len__(self):
+        return len(self._rows)
+        
+    def __contains__(self, task_id):
+        return task_id in self._rows
+        
+    def load(self, tasks):
+        """Replace the contents with a list of task dicts, converting each column in one pass"""
+        self.clear()
+        count = self._fill(tasks)
+        self._live[:count] = True
+        self._size = count
+        self.version += 1
+        self._rows = {task_id: row for row, task_id in enumerate(self._columns["ID"][:count])}
+        
+    def extend(self, tasks):
+        """Append a batch of tasks, converting each column in one pass; returns their views"""
+        start = self._size
+        count = self._fill(tasks, start)
+        self._live[start:start + count] = True
+        self._size += count
+        self.version += 1
+        ids = self._columns["ID"][start:start + count].tolist()
+        self._rows.update(zip(ids, range(start, start + count)))
+        self._rows_changed(range(start, start + count))
+        return [TaskRow(self, task_id) for task_id in ids]
+        
+    def _fill(self, tasks, start=0):
+        # Write task dicts into the rows from start on, growing the columns as needed.
+        # pandas is only imported for these bulk loads; a mapped snapshot is adopted without it
+        import pandas as pd
+        frame = pd.DataFrame(tasks)
+        count = len(frame)
+        self._grow(start + count)
+        for field in FIELDS:
+            if field not in frame:
+                frame[field] = ""
+        blank = frame[list(FIELDS)].isna()
+        
+        for field in TEXT_FIELDS:
+            values = frame[field].to_numpy(dtype=object, copy=True)
+            values[blank[field].to_numpy()] = ""
+            self._columns[field][start:start + count] = values
+        for field in CODE_FIELDS:
+            self._columns[field][start:start + count] = self.categories[field].encode(frame[field])
+        ids = self._columns["ID"][start:start + count]
+        for field, fmt in DATE_FIELDS.items():
+            parsed = pd.to_datetime(frame[field], format=fmt, errors="coerce")
+            self._columns[field][start:start + count] = parsed.to_numpy(dtype="datetime64[m]")
+            # Keep text that is not a date in this format exactly as it was
+            for row in np.flatnonzero(parsed.isna().to_numpy() & ~blank[field].to_numpy()
+                                      & (frame[field] != "").to_numpy()):
+                self._raw[(field, ids[row])] = str(frame[field].iloc[row])
+                
+        extra_fields = [field for field in frame.columns if field not in TASK_COLUMNS]
+        if extra_fields:
+            for row, extra in enumerate(frame[extra_fields].to_dict("records")):
+                # The frame pads columns that only some rows have with NaN; keep just the real values
+                extra = {field: value for field, value in extra.items() if not is_blank(value)}
+                if extra:
+                    self._extras[ids[row]] = extra
+        return count
+        
+    def load_mapped(self, snapshot):
+        """Replace the contents with a MappedSnapshot without copying its columns"""
+        self.clear()
+        count = snapshot.count
+        meta = snapshot.meta
+        for field in CODE_FIELDS:
+            # The file's codes index its own value lists
+            categories = self.categories[field] = Categories()
+            for value in meta["categories"][field]:
+                categories.code(value)
+        for field in CODE_FIELDS + tuple(DATE_FIELDS):
+            self._columns[field] = snapshot.column(field)
+            
+        # IDs are needed up front to address rows; they are fixed-width and nearly always ASCII
+        ids = snapshot.column("ID")
+        try:
+            ids = ids.astype("U").astype(object)
+        except UnicodeDecodeError:
+            ids = np.array([task_id.decode("utf-8") for task_id in ids], dtype=object)
+        self._columns["ID"] = ids
+        for field in HEAP_FIELDS:
+            self._columns[field] = np.empty(count, dtype=object)
+            
+        self._raw = {(field, task_id): value for field, task_id, value in meta["raw"]}
+        self._extras = dict(meta["extras"])
+        self._live = np.ones(count, dtype=bool)
+        self._size = count
+        self._mapped = snapshot
+        self.version += 1
+        self._rows = dict(zip(ids.tolist(), range(count)))
+        
+    def save_mapped(self, path, seq=None):
+        """Write the live tasks as a snapshot that load_mapped() can map"""
+        self._decode()
+        rows = self.live_rows()
+        ids = self._columns["ID"][rows]
+        fixed = {field: self._columns[field][rows] for field in CODE_FIELDS + tuple(DATE_FIELDS)}
+        fixed["ID"] = np.array([task_id.encode("utf-8") for task_id in ids], dtype="S")
+        texts = {field: self._columns[field][rows] for field in HEAP_FIELDS}
+        meta = {
+            "seq": seq,
+            "categories": {field: self.categories[field].values for field in CODE_FIELDS},
+            "raw": [[field, task_id, value] for (field, task_id), value in self._raw.items()
+                    if task_id in self._rows],
+            "extras": {task_id: extra for task_id, extra in self._extras.items() if task_id in self._rows},
+        }
+        write_snapshot(path, len(rows), fixed, texts, meta)
+        
+    def _decode(self):
+        # Decode every row still held only in the mapped snapshot, before bulk reads or moving rows
+        snapshot = self._mapped
+        if snapshot is None:
+            return
+        count = snapshot.count
+        for field in HEAP_FIELDS:
+            column = self._columns[field]
+            rows = np.flatnonzero(self._live[:count] & np.equal(column[:count], None))
+            column[rows] = np.array(snapshot.texts(field, rows), dtype=object)
+        self._mapped = None
+        
+    def detach(self):
+        """Copy every column out of the mapped snapshot so its file can be replaced"""
+        self._decode()
+        for field, column in self._columns.items():
+            if column.base is not None:
+                self._columns[field] = column.copy()
+        
+    def _set(self, row, task):
+        self.version += 1
+        task_id = task["ID"]
+        for field in TEXT_FIELDS:
+            value = task.get(field)
+            self._columns[field][row] = "" if is_blank(value) else value
+        for field in CODE_FIELDS:
+            self._columns[field][row] = self.categories[field].code(task.get(field))
+        for field, fmt in DATE_FIELDS.items():
+            value = task.get(field)
+            self._raw.pop((field, task_id), None)
+            parsed = parse_date(value, fmt)
+            if parsed is None:
+                self._columns[field][row] = np.datetime64("NaT")
+                if not is_blank(value):
+                    self._raw[(field, task_id)] = str(value)
+            else:
+                self._columns[field][row] = np.datetime64(parsed, "m")
+        extra = {field: value for field, value in task.items() if field not in TASK_COLUMNS}
+        if extra:
+            self._extras[task_id] = extra
+        else:
+            self._extras.pop(task_id, None)
+            
+    def append(self, task):
+        self._grow(self._size + 1)
+        row = self._size
+        self._set(row, task)
+        self._live[row] = True
+        self._size += 1
+        self._rows[task["ID"]] = row
+        self._rows_changed((row,))
+        return TaskRow(self, task["ID"])
+        
+    def update(self, task_id, task):
+        """Overwrite a task in place, keeping its position in the list"""
+        row = self._rows[task_id]
+        self._set(row, task)
+        self._rows_changed((row,))
+        
+    def delete(self, task_id):
+        row = self._rows.pop(task_id)
+        self.version += 1
+        self._live[row] = False
+        self._columns["Title"][row] = self._columns["Description"][row] = None
+        for field in DATE_FIELDS:
+            self._raw.pop((field, task_id), None)
+        self._extras.pop(task_id, None)
+        if self._index is not None:
+            self._index.remove(row)
+        self._dead += 1
+        if self._dead > 1024 and self._dead * 2 > self._size:
+            self._squeeze()
+            
+    def _squeeze(self):
+        # Drop the dead rows; row numbers change, IDs and views do not
+        self._decode()
+        self.version += 1
+        keep = np.flatnonzero(self._live[:self._size])
+        for field, column in self._columns.items():
+            column[:len(keep)] = column[keep]
+        self._live[:len(keep)] = True
+        self._live[len(keep):] = False
+        self._size = len(keep)
+        self._dead = 0
+        self._rows = {task_id: row for row, task_id in enumerate(self._columns["ID"][:self._size])}
+        self._index = None  # Keyed by the old row numbers
+        for field, (values, ranks) in self._ranks.items():
+            ranks[:len(keep)] = ranks[keep]
+        
+    def _rows_changed(self, rows):
+        # Keep the search index and sort ranks in step with changed rows; past a point a rebuild is cheaper
+        index = self._index
+        if index is not None:
+            titles, descriptions = self._columns["Title"], self._columns["Description"]
+            for row in rows:
+                index.update(row, titles[row], descriptions[row])
+            if index.needs_rebuild():
+                self._index = None
+        if len(rows) > MAX_RERANK:
+            self._ranks.clear()
+        for field, (values, ranks) in self._ranks.items():
+            column = self._columns[field]
+            for row in rows:
+                text = sort_text(column[row])
+                rank = bisect_left(values, text)
+                if rank == len(values) or values[rank] != text:
+                    # A new value: make room for it in the order
+                    values.insert(rank, text)
+                    ranks[:self._size][ranks[:self._size] >= rank] += 1
+                ranks[row] = rank
+        
+    def value(self, task_id, field):
+        row = self._rows[task_id]
+        if field in CODE_FIELDS:
+            return self.categories[field].values[self._columns[field][row]]
+        if field in DATE_FIELDS:
+            value = self._columns[field][row]
+            if np.isnat(value):
+                return self._raw.get((field, task_id), "")
+            return np.datetime_as_string(value, unit=DATE_UNITS[field]).replace("T", " ")
+        if field in TEXT_FIELDS:
+            value = self._columns[field][row]
+            if value is None:
+                # Not decoded from the mapped snapshot yet; if it was just decoded in bulk, read that
+                snapshot = self._mapped
+                value = snapshot.text(field, row) if snapshot is not None else self._columns[field][row]
+                self._columns[field][row] = value
+            return value
+        return self._extras[task_id][field]
+        
+    def fields_of(self, task_id):
+        extra = self._extras.get(task_id)
+        return FIELDS + tuple(extra) if extra else FIELDS
+        
+    def row(self, task_id):
+        return TaskRow(self, task_id)
+        
+    def live_rows(self, mask=None):
+        """Row numbers of the live tasks in list order, optionally only where mask is set"""
+        live = self._live[:self._size]
+        return np.flatnonzero(live if mask is None else live & mask)
+        
+    def rows(self, mask=None):
+        """Views of the tasks in list order, optionally only where mask (over all rows) is set"""
+        return self.take(self.live_rows(mask))
+        
+    def take(self, rows):
+        """Views of the tasks at the given row numbers, in that order"""
+        return TaskList(self, self._columns["ID"][rows], rows, self.version)
+        
+    def cached(self, key, compute):
+        """compute() for key, reused until the table next changes"""
+        if self._cache_version != self.version:
+            self._cache.clear()
+            self._cache_version = self.version
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+        
+    def text_ranks(self, field):
+        """(sorted values, ranks) of a text field, lowercased.
+        
+        ranks[row] is the position of the row's value in values, so equal
+        texts rank equal and ranks sort as the texts do. Built with one
+        sort on first use, then kept up to date row by row, so a sort
+        after an edit does not sort the texts again. Values no longer in
+        use stay in the list until the next rebuild.
+        """
+        if field not in self._ranks:
+            import pandas as pd
+            self._decode()
+            ranks = np.zeros(len(self._live), dtype=np.int64)
+            texts = pd.Series(self._columns[field][:self._size], dtype=object).map(sort_text)
+            codes, values = pd.factorize(texts, sort=True)
+            ranks[:self._size] = codes
+            self._ranks[field] = (values.tolist(), ranks)
+        values, ranks = self._ranks[field]
+        return values, ranks[:self._size]
+        
+    def column(self, field):
+        """The raw column of field over all rows: object, int16 codes or datetime64"""
+        if field in HEAP_FIELDS:
+            self._decode()
+        return self._columns[field][:self._size]
+        
+    def reminders(self):
+        """(IDs, Reminder Time as datetime64) of the live, unfinished tasks with a valid reminder"""
+        live = self._live[:self._size]
+        when = self._columns["Reminder Time"][:self._size]
+        mask = live & ~np.isnat(when)
+        completed = self.categories["Status"].codes.get("Completed")
+        if completed is not None:
+            mask &= self._columns["Status"][:self._size] != completed
+        rows = np.flatnonzero(mask)
+        return self._columns["ID"][rows], when[rows]
+        
+    def has_raw(self, field):
+        """Rows whose field holds text that did not parse as a date"""
+        mask = np.zeros(self._size, dtype=bool)
+        for raw_field, task_id in self._raw:
+            if raw_field == field and task_id in self._rows:
+                mask[self._rows[task_id]] = True
+        return mask
+        
+    def mask(self, values):
+        """Rows whose fields equal the given values, e.g. mask({"Priority": "High"}); "All" matches anything"""
+        mask = np.ones(self._size, dtype=bool)
+        for field, value in values.items():
+            if value == "All":
+                continue
+            code = self.categories[field].codes.get(value)
+            if code is None:
+                return np.zeros(self._size, dtype=bool)
+            mask &= self._columns[field][:self._size] == code
+        return mask
+        
+    def id_mask(self, task_ids):
+        """Rows of the tasks with the given IDs; IDs not in the table are skipped"""
+        mask = np.zeros(self._size, dtype=bool)
+        mask[[self._rows[task_id] for task_id in task_ids if task_id in self._rows]] = True
+        return mask
+        
+    def text_mask(self, text):
+        """Rows whose Title or Description contains text, case-insensitively"""
+        self._decode()
+        text = text.lower()
+        titles, descriptions = self._columns["Title"], self._columns["Description"]
+        if self._index is None:
+            self._index = SearchIndex(titles[:self._size], descriptions[:self._size])
+        found = self._index.candidates(text)
+        if found is None:
+            # Only spaces or punctuation; no token to look up, so check every live row
+            rows = self.live_rows()
+            exact = False
+        else:
+            rows, exact = found
+        if not exact:
+            keep = [text in lower_text(title) or text in lower_text(description)
+                    for title, description in zip(titles[rows], descriptions[rows])]
+            rows = rows[np.array(keep, dtype=bool)]
+        mask = np.zeros(self._size, dtype=bool)
+        mask[rows] = True
+        return mask
+                
+    def copy(self):
+        """A compact copy of the live tasks, to read (e.g. with to_records) without holding the owner's lock.
+        
+        Only the columns are gathered; the text values are shared, since
+        strings are immutable and the raw text and extras are replaced, not
+        changed in place.
+        """
+        self._decode()
+        rows = self.live_rows()
+        table = TaskTable()
+        for field, categories in self.categories.items():
+            table.categories[field].values = list(categories.values)
+            table.categories[field].codes = dict(categories.codes)
+        table._columns = {field: column[rows] for field, column in self._columns.items()}
+        table._live = np.ones(len(rows), dtype=bool)
+        table._size = len(rows)
+        table._rows = dict(zip(table._columns["ID"].tolist(), range(len(rows))))
+        table._raw.update(self._raw)
+        table._extras.update(self._extras)
+        return table
+        
+    def to_records(self, rows=None):
+        """The tasks (or those at the given row numbers) as plain dicts in list order, for writing snapshots"""
+        self._decode()
+        if rows is None:
+            rows = self.live_rows()
+        ids = self._columns["ID"][rows]
+        columns = {}
+        for field in FIELDS:
+            column = self._columns[field][rows]
+            if field in CODE_FIELDS:
+                column = np.array(self.categories[field].values, dtype=object)[column]
+            elif field in DATE_FIELDS:
+                text = np.char.replace(np.datetime_as_string(column, unit=DATE_UNITS[field]), "T", " ")
+                column = np.where(np.isnat(column), "", text).astype(object)
+                for (raw_field, task_id), value in self._raw.items():
+                    if raw_field == field and task_id in self._rows:
+                        position = np.searchsorted(rows, self._rows[task_id])
+                        if position < len(rows) and rows[position] == self._rows[task_id]:
+                            column[position] = value
+            columns[field] = column.tolist()
+        records = [dict(zip(FIELDS, values)) for values in zip(*(columns[field] for field in FIELDS))]
+        if self._extras:
+            for task_id, record in zip(ids, records):
+                record.update(self._extras.get(task_id, ()))
+        return records
@@ -0,0 +1,161 @@
+import tkinter as tk
+from tkinter import ttk
+from instrumentation import timed, count
+
+# Columns of the task and history lists
+TASK_COLUMNS = ("Title", "Description", "Date", "Reminder Time", "Priority", "Category", "Status")
+
+def task_values(task):
+    """Row values of a task for TASK_COLUMNS"""
+    return (
+        task["Title"],
+        task["Description"],
+        task["Due Date"],
+        task.get("Reminder Time", ""),  # Get reminder time with default empty string
+        task["Priority"],
+        task["Category"],
+        task["Status"]
+    )
+
+class VirtualTreeview:
+    """Treeview that only materializes the rows around the visible window.
+    
+    The full row list stays in Python and only the visible rows plus
+    `overscan` rows above and below exist as Treeview items. Every change
+    (new rows, scrolling, a filter) is reconciled against the items
+    already shown: each row keeps its item for as long as it stays in the
+    window, and only the inserts, value updates, deletes and moves that
+    differ are sent to Tk.
+    """
+    def __init__(self, parent, columns, values_for, tags_for=None, key_for=id, overscan=20,
+                 **tree_options):
+        self.values_for = values_for  # row -> tuple of column values
+        self.tags_for = tags_for or (lambda row: ())  # row -> tuple of Treeview tags
+        self.key_for = key_for  # row -> stable key identifying it across updates
+        self.overscan = overscan
+        self.rows = []
+        self.first = 0  # Index in rows of the first materialized item
+        self.top = 0  # Index in rows of the first visible item
+        self.visible = 30  # Rows that fit in the widget, updated on resize
+        self._order = []  # Keys of the materialized rows in display order
+        self._items = {}  # key -> Treeview item id
+        self._keys = {}  # Treeview item id -> key
+        self._rows = {}  # key -> row
+        self._shown = {}  # key -> (values, tags) last sent to Tk
+        self._pending_render = None
+        
+        self.tree = ttk.Treeview(parent, columns=columns, show="headings", **tree_options)
+        self.scrollbar = ttk.Scrollbar(parent, orient=tk.VERTICAL, command=self.yview)
+        
+        # The tree scrolls natively inside the materialized window (mouse wheel, arrow keys);
+        # its reports tell us when the window has to move
+        self.tree.configure(yscrollcommand=self._on_tree_scroll)
+        self.tree.bind("<Configure>", self._on_configure, add="+")
+        
+    @timed("view.set_rows")
+    def set_rows(self, rows):
+        """Show a new row list, keeping the scroll position where possible"""
+        self.rows = rows
+        self._render(self.top)
+        
+    def row(self, item):
+        return self._rows[self._keys[item]]
+        
+    def yview(self, *args):
+        # Scrollbar command: position the window over the whole row list
+        if args[0] == "moveto":
+            top = int(float(args[1]) * len(self.rows))
+        elif args[0] == "scroll":
+            step = self.visible if args[2] == "pages" else 1
+            top = self.top + int(args[1]) * step
+        else:
+            return
+        self._render(top)
+        
+    @timed("view.render")
+    def _render(self, top):
+        top = max(0, min(top, len(self.rows) - self.visible))
+        size = self.visible + 2 * self.overscan
+        first = max(0, min(top - self.overscan, len(self.rows) - size))
+        window = self.rows[first:first + size]
+        
+        self._reconcile(window)
+        self.first = first
+        self.top = top
+        if window:
+            self.tree.yview_moveto((top - first) / len(window))
+        self._update_scrollbar()
+        
+    def _reconcile(self, window):
+        keys = [self.key_for(row) for row in window]
+        wanted = set(keys)
+        
+        # Drop the items whose rows left the window
+        dropped = [key for key in self._order if key not in wanted]
+        for key in dropped:
+            item = self._items.pop(key)
+            del self._keys[item], self._rows[key], self._shown[key]
+            self.tree.delete(item)
+        current = [key for key in self._order if key in wanted]
+        
+        inserted = updated = moved = 0
+        for position, (key, row) in enumerate(zip(keys, window)):
+            shown = (self.values_for(row), self.tags_for(row))
+            item = self._items.get(key)
+            if item is None:
+                item = self.tree.insert("", position, values=shown[0], tags=shown[1])
+                self._items[key] = item
+                self._keys[item] = key
+                current.insert(position, key)
+                inserted += 1
+            else:
+                if self._shown[key] != shown:
+                    self.tree.item(item, values=shown[0], tags=shown[1])
+                    updated += 1
+                if current[position] != key:
+                    self.tree.move(item, "", position)
+                    current.remove(key)
+                    current.insert(position, key)
+                    moved += 1
+            self._rows[key] = row
+            self._shown[key] = shown
+        self._order = keys
+        
+        # Tk calls made, as counters next to the view.render timings
+        count("view.deletes", len(dropped))
+        count("view.inserts", inserted)
+        count("view.updates", updated)
+        count("view.moves", moved)
+        
+    def _on_tree_scroll(self, lo, hi):
+        shown = len(self._order)
+        self.top = self.first + int(round(float(lo) * shown)) if shown else 0
+        self._update_scrollbar()
+        
+        # Slide the window once the view gets within half an overscan of its edges
+        margin = self.overscan // 2
+        near_start = self.first > 0 and self.top - self.first < margin
+        near_end = self.first + shown < len(self.rows) and \
+                   self.first + shown - (self.top + self.visible) < margin
+        if (near_start or near_end) and self._pending_render is None:
+            self._pending_render = self.tree.after_idle(self._deferred_render)
+            
+    def _deferred_render(self):
+        self._pending_render = None
+        self._render(self.top)
+        
+    def _update_scrollbar(self):
+        total = len(self.rows)
+        if total <= self.visible:
+            self.scrollbar.set(0, 1)
+        else:
+            self.scrollbar.set(self.top / total, min(1.0, (self.top + self.visible) / total))
+            
+    def _on_configure(self, event):
+        style = self.tree.cget("style") or "Treeview"
+        row_height = int(ttk.Style().lookup(style, "rowheight") or 20)
+        # Leave room for the heading row
+        visible = max(1, (event.height - row_height) // row_height)
+        if visible != self.visible:
+            self.visible = visible
+            self._render(self.top)
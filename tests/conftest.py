@@ -0,0 +1,16 @@
+import os
+import sys
+import pytest
+
+# The modules live at the top of the repository, not in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def make_task(task_id, title="Task", **fields):
+    task = {"ID": task_id, "Title": title, "Description": "", "Due Date": "", "Priority": "Medium",
+            "Category": "Other", "Status": "Pending", "Reminder Time": ""}
+    task.update(fields)
+    return task
+
+@pytest.fixture
+def data_dir(tmp_path):
+    return str(tmp_path / "data")
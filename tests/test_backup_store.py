@@ -0,0 +1,108 @@
+from datetime import datetime, timedelta
+import os
+import pytest
+from backup_store import BackupStore, history_pages
+from database import DatabaseManager
+from history_store import CHUNK_SIZE
+from conftest import make_task
+
+def pages(rows):
+    return history_pages(len(rows), lambda start, count: rows[start:start + count])
+
+def object_count(store):
+    return sum(len(files) for _, _, files in os.walk(store.objects_dir))
+
+@pytest.fixture
+def store(tmp_path):
+    return BackupStore(str(tmp_path / "store"))
+
+@pytest.fixture
+def db(data_dir, store):
+    manager = DatabaseManager(data_dir=data_dir, backup_store=store)
+    yield manager
+    manager.close()
+
+def test_backup_restore_round_trip(store):
+    tasks = [make_task(f"t{number}", f"Task {number}") for number in range(600)]
+    history = [make_task(f"h{number}") for number in range(CHUNK_SIZE + 5)]
+    manifest = store.backup(tasks, pages(history), len(history))
+    assert (manifest["task_count"], manifest["history_count"]) == (600, CHUNK_SIZE + 5)
+    assert store.restore(manifest["id"]) == (tasks, history)
+
+def test_unchanged_backup_is_skipped(store):
+    tasks = [make_task("a")]
+    assert store.backup(tasks, pages([]), 0)
+    assert store.backup(tasks, pages([]), 0) is None
+    assert len(store.list()) == 1
+
+def test_backup_only_writes_changed_chunks(store):
+    tasks = [make_task(f"t{number}") for number in range(2000)]
+    store.backup(tasks, pages([]), 0)
+    tasks[-1] = make_task(tasks[-1]["ID"], "Edited")
+    manifest = store.backup(tasks, pages([]), 0)
+    first, second = store.list()[::-1]
+    assert len(set(second["tasks"]) - set(first["tasks"])) == 1
+    assert manifest["bytes_written"] > 0
+
+def test_history_pages_stop_at_the_count():
+    rows = [make_task(f"h{number}") for number in range(CHUNK_SIZE + 10)]
+    # Rows appended after the count was taken are left to the change log
+    read = lambda start, count: rows[start:start + count]
+    assert sum(len(page) for page in history_pages(CHUNK_SIZE + 3, read)) == CHUNK_SIZE + 3
+    assert list(history_pages(0, read)) == []
+
+def test_state_at_replays_the_log(db, store):
+    db.add_task(make_task("a", "First"))
+    manifest = db.backup(store)
+    before = datetime.fromisoformat(manifest["as_of"])
+    db.update_task("a", make_task("a", "First, edited"))
+    db.add_task(make_task("b", "Second"))
+    db.delete_task("a")
+    
+    tasks, history = store.state_at(datetime.now())
+    assert [(task["ID"], task["Title"]) for task in tasks] == [("b", "Second")]
+    assert [task["ID"] for task in history] == ["a", "b"]
+    tasks, history = store.state_at(before)
+    assert [(task["ID"], task["Title"]) for task in tasks] == [("a", "First")]
+    with pytest.raises(ValueError):
+        store.state_at(before - timedelta(days=1))
+
+def test_history_added_during_a_backup_is_not_duplicated(db, store):
+    db.add_task(make_task("a"))
+    read_history = db.read_history
+    def add_while_reading(start, count):
+        # Another thread adding a task after the backup counted the history
+        if "b" not in db.table:
+            db.add_task(make_task("b"))
+        return read_history(start, count)
+    db.read_history = add_while_reading
+    db.backup(store)
+    
+    tasks, history = store.state_at(datetime.now())
+    assert sorted(task["ID"] for task in tasks) == ["a", "b"]
+    assert [task["ID"] for task in history] == ["a", "b"]
+
+def test_restore_state_round_trip(db, store):
+    db.add_task(make_task("a", "Keep me"))
+    db.backup(store)
+    when = datetime.now()
+    db.clear_all_tasks()
+    db.clear_all_history()
+    
+    tasks, history, (added, removed, changed) = db.preview_restore(store, when)
+    assert ([task["ID"] for task in added], removed, changed) == (["a"], [], [])
+    db.restore_state(tasks, history)
+    assert [task["Title"] for task in db.get_all_tasks()] == ["Keep me"]
+    assert db.history_count() == 1
+
+def test_prune_keeps_the_retention_policy(store):
+    for number in range(4):
+        store.backup([make_task(f"t{number}")], pages([]), 0)
+    now = datetime.fromisoformat(store.latest()["created"]) + timedelta(days=30)
+    # Only the last two survive once the daily and weekly windows have passed
+    removed = store.prune(now=now, last=2)
+    assert len(removed) == 2
+    assert len(store.list()) == 2
+    assert object_count(store) == 2
+    for manifest in store.list():
+        store.restore(manifest["id"])
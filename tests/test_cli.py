@@ -0,0 +1,56 @@
+import csv
+import json
+import pytest
+import cli
+from database import DatabaseManager
+
+def run(data_dir, *args):
+    return cli.main(["--data-dir", data_dir, "--no-log", "-q", *args])
+
+def test_import_export_round_trip(data_dir, tmp_path):
+    source = tmp_path / "tasks.jsonl"
+    source.write_text("".join(json.dumps({"ID": f"t{number}", "Title": f"Task {number}", "Priority": "High"}) + "\n"
+                              for number in range(25)), encoding="utf-8")
+    assert run(data_dir, "import", str(source), "--batch-size", "10") == 0
+    
+    # A row with a known ID updates that task and keeps the fields it leaves out
+    update = tmp_path / "update.csv"
+    update.write_text("ID,Title\nt3,Renamed\n", encoding="utf-8")
+    assert run(data_dir, "import", str(update)) == 0
+    
+    target = tmp_path / "out.csv"
+    assert run(data_dir, "export", str(target)) == 0
+    with open(target, encoding="utf-8", newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 25
+    assert (rows[3]["Title"], rows[3]["Priority"]) == ("Renamed", "High")
+    
+    jsonl = tmp_path / "out.jsonl"
+    assert run(data_dir, "export", str(jsonl)) == 0
+    exported = [json.loads(line) for line in jsonl.read_text(encoding="utf-8").splitlines()]
+    assert [task["ID"] for task in exported] == [f"t{number}" for number in range(25)]
+
+def test_list_sorts_and_filters(data_dir, capsys):
+    for title, priority in (("beta", "Low"), ("Alpha", "High"), ("gamma", "High")):
+        assert run(data_dir, "add", title, "--priority", priority) == 0
+    capsys.readouterr()
+    assert run(data_dir, "list", "--priority", "High", "--sort", "Title", "--desc", "--format", "jsonl") == 0
+    titles = [json.loads(line)["Title"] for line in capsys.readouterr().out.splitlines()]
+    assert titles == ["gamma", "Alpha"]
+
+def test_list_rejects_unknown_sort_fields(data_dir):
+    with pytest.raises(SystemExit) as raised:
+        run(data_dir, "list", "--sort", "Date")
+    assert raised.value.code == 2
+
+def test_delete_skips_unknown_ids(data_dir, capsys):
+    assert run(data_dir, "add", "Keep") == 0
+    assert run(data_dir, "add", "Drop") == 0
+    keep, drop = capsys.readouterr().out.split()
+    assert run(data_dir, "delete", drop, "missing") == 1
+    assert "No task with ID missing" in capsys.readouterr().err
+    db = DatabaseManager(data_dir=data_dir)
+    try:
+        assert [task["ID"] for task in db.get_all_tasks()] == [keep]
+    finally:
+        db.close()
@@ -0,0 +1,114 @@
+import os
+import stat
+import pytest
+from journal import Journal
+from storage import SnapshotBackend
+from conftest import make_task
+
+def open_backend(data_dir):
+    os.makedirs(data_dir, exist_ok=True)
+    return SnapshotBackend(os.path.join(data_dir, "tasks.xlsx"), os.path.join(data_dir, "history.xlsx"))
+
+def test_recover_skips_records_in_the_snapshot(tmp_path):
+    journal = Journal(str(tmp_path / "tasks.journal"))
+    journal.append("add", task=make_task("a"))
+    journal.extend("add", [{"task": make_task("b")}, {"task": make_task("c")}])
+    journal.close()
+    
+    reopened = Journal(journal.path)
+    records = reopened.recover(1)
+    assert [record["task"]["ID"] for record in records] == ["b", "c"]
+    assert (reopened.seq, reopened.length) == (3, 2)
+    assert reopened.append("delete", id="b")["seq"] == 4
+    reopened.close()
+
+def test_recover_stops_at_a_torn_record(tmp_path):
+    journal = Journal(str(tmp_path / "tasks.journal"))
+    journal.append("add", task=make_task("a"))
+    journal.close()
+    with open(journal.path, "a", encoding="utf-8") as f:
+        f.write('{"op": "add", "ta')
+    assert [record["seq"] for record in Journal(journal.path).recover(0)] == [1]
+
+def test_truncate_keeps_only_later_records(tmp_path):
+    journal = Journal(str(tmp_path / "tasks.journal"))
+    for task_id in "abc":
+        journal.append("add", task=make_task(task_id))
+    journal.truncate(2)
+    assert [record["seq"] for record in journal.read()] == [3]
+    assert journal.length == 1
+    # Appending after a truncate reopens the file and keeps numbering on
+    journal.append("delete", id="a")
+    assert [record["seq"] for record in journal.read()] == [3, 4]
+    journal.close()
+
+def test_changes_replay_from_the_journal(data_dir):
+    backend = open_backend(data_dir)
+    backend.save_tasks([make_task("a", "First"), make_task("b", "Second")])
+    backend.record_task("update", "a", make_task("a", "First, edited"))
+    backend.record_task("delete", "b")
+    backend.record_tasks("add", [make_task("c", "Third")])
+    backend.close()
+    
+    backend = open_backend(data_dir)
+    assert [(task["ID"], task["Title"]) for task in backend.load_tasks()] == [("a", "First, edited"),
+                                                                                ("c", "Third")]
+    assert backend.tasks_journal.length == 3
+    backend.close()
+
+def test_save_tasks_folds_the_journal_into_the_snapshot(data_dir):
+    backend = open_backend(data_dir)
+    backend.record_task("add", task=make_task("a"))
+    backend.record_task("add", task=make_task("b"))
+    backend.save_tasks([make_task("a"), make_task("b")])
+    assert backend.tasks_journal.read() == []
+    backend.record_task("delete", "a")
+    backend.close()
+    
+    backend = open_backend(data_dir)
+    assert [task["ID"] for task in backend.load_tasks()] == ["b"]
+    backend.close()
+
+def test_compaction_only_folds_the_records_in_the_copy(data_dir):
+    backend = open_backend(data_dir)
+    backend.record_task("add", task=make_task("a"))
+    checkpoint = backend.checkpoint()
+    # Written after the tasks were copied for the compaction, so it has to survive it
+    backend.record_task("add", task=make_task("b"))
+    backend.compact([make_task("a")], checkpoint)
+    assert [record["seq"] for record in backend.tasks_journal.read()] == [2]
+    backend.close()
+    
+    backend = open_backend(data_dir)
+    assert [task["ID"] for task in backend.load_tasks()] == ["a", "b"]
+    backend.close()
+
+def test_snapshot_is_synced_before_the_journal_is_truncated(data_dir, monkeypatch):
+    backend = open_backend(data_dir)
+    backend.record_task("add", task=make_task("a"))
+    events = []
+    real_fsync = os.fsync
+    def fsync(fd):
+        events.append("fsync")
+        real_fsync(fd)
+    monkeypatch.setattr(os, "fsync", fsync)
+    truncate = backend.tasks_journal.truncate
+    monkeypatch.setattr(backend.tasks_journal, "truncate", lambda seq: (events.append("truncate"), truncate(seq)))
+    backend.save_tasks([make_task("a")])
+    backend.close()
+    # The new file, then (where directories can be synced) the directory holding the rename
+    expected = ["fsync", "fsync"] if hasattr(os, "O_DIRECTORY") else ["fsync"]
+    assert events == expected + ["truncate"]
+
+@pytest.mark.skipif(os.name == "nt", reason="Windows files have no permission bits")
+def test_snapshot_keeps_the_usual_file_mode(data_dir):
+    backend = open_backend(data_dir)
+    backend.save_tasks([make_task("a")])
+    umask = os.umask(0)
+    os.umask(umask)
+    assert stat.S_IMODE(os.stat(backend.tasks_file).st_mode) == 0o666 & ~umask
+    
+    os.chmod(backend.tasks_file, 0o640)
+    backend.save_tasks([make_task("a")])
+    assert stat.S_IMODE(os.stat(backend.tasks_file).st_mode) == 0o640
+    backend.close()
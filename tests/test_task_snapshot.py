@@ -0,0 +1,35 @@
+from storage import MappedFormat
+from task_table import TaskTable
+from conftest import make_task
+
+TASKS = [
+    make_task("a", "Café ☕", **{"Due Date": "2026-01-02", "Priority": "High", "Category": "Work",
+                               "Reminder Time": "2026-01-02 09:30"}),
+    # A due date the table cannot parse is kept as it was typed; columns outside the schema ride along
+    make_task("b", "Second", Description="two\nlines", Status="Completed", Priority="",
+              **{"Due Date": "next week", "Note": "extra"}),
+    make_task("c", ""),
+]
+
+def test_mapped_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "tasks.snap")
+    MappedFormat().write(path, TASKS, 7)
+    tasks, seq = MappedFormat().read(path)
+    assert seq == 7
+    assert tasks == TASKS
+
+def test_mapped_table_takes_edits(tmp_path):
+    path = str(tmp_path / "tasks.snap")
+    MappedFormat().write(path, TASKS, 0)
+    table = TaskTable()
+    table.load_mapped(MappedFormat().open(path))
+    table.update("a", make_task("a", "Edited"))
+    table.delete("b")
+    table.append(make_task("d", "Fourth"))
+    table.detach()
+    
+    # Saved over the file the table was mapped from
+    table.save_mapped(path, 3)
+    tasks, seq = MappedFormat().read(path)
+    assert seq == 3
+    assert [(task["ID"], task["Title"]) for task in tasks] == [("a", "Edited"), ("c", ""), ("d", "Fourth")]